@@ -13,13 +13,11 @@ from website.models import Endereco
 from .models import Cliente
 
 # Utils
-from utils.serializers import UpdateNestedMixin
+from utils.serializers import UpdateNestedMixin, CamposDinamicosMixin
+from utils.fields import ImagemField
 
-# Others
-from drf_extra_fields.fields import Base64ImageField
 
-
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     class Meta:
         model = User
@@ -35,10 +33,10 @@ class UserSerializer(serializers.ModelSerializer):
         return value
 
 
-class ClienteSerializer(UpdateNestedMixin, serializers.ModelSerializer):
+class ClienteSerializer(CamposDinamicosMixin, UpdateNestedMixin, serializers.ModelSerializer):
     user = UserSerializer()
     enderecos = EnderecoSerializer(many=True)
-    foto = Base64ImageField(allow_null=True, required=False)
+    foto = ImagemField(allow_null=True, required=False)
     data_nascimento = serializers.DateField(format="%d/%m/%Y")
 
     class Meta:
@@ -67,3 +65,11 @@ class ClienteSerializer(UpdateNestedMixin, serializers.ModelSerializer):
             cliente.enderecos.add(endereco)
         cliente.save()
         return cliente
+
+
+class ClienteFotoSerializer(serializers.ModelSerializer):
+    foto = ImagemField()
+
+    class Meta:
+        model = Cliente
+        fields = ['foto']
@@ -3,36 +3,40 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
 
 # Django
 from django.utils.encoding import force_bytes, force_text
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.template.loader import render_to_string
-from django.core.mail import EmailMessage
+from django.contrib.auth.models import User
 from django.conf import settings
 
 # Accounts
 from .permissions import IsOwnerOrStaffOrCreateOnly
 from .tokens import account_activation_token
 from .models import Cliente
-from .serializers import ClienteSerializer
+from .serializers import ClienteSerializer, ClienteFotoSerializer
 
 # Website
 from website.models import Oferta, Endereco, Carrinho, Produto
 from website.serializers import (EnderecoSerializer, AvaliacaoProdutoSerializer,
                                  VendaSerializer, ProdutoSerializer, CarrinhoSerializer)
+from website.pagination import VendaPagination, AvaliacaoProdutoPagination
 
 # Utils
 from utils.shortcuts import get_object_or_404
 from utils.fields import get_fields
-from utils.schemas import CustomSchema
-from utils.viewsets import list_response, paginated_schema
+from utils.schemas import CustomSchema, MultipartSchema
+from utils.viewsets import list_response, paginated_schema, prefetch_campos, PrefetchCamposMixin
+from utils.mail import enfileirar_email
+from utils.uploads import UploadMultiPartParser
 
 from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import swagger_auto_schema, no_body
 
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class ClienteViewSet(PrefetchCamposMixin, viewsets.ModelViewSet):
     """
 
     Endpoint relacionado aos clientes.
@@ -41,6 +45,7 @@ class ClienteViewSet(viewsets.ModelViewSet):
     serializer_class = ClienteSerializer
     queryset = Cliente.objects.all()
     permission_classes = (IsOwnerOrStaffOrCreateOnly, )
+    prefetch_plano = {'user': ['user'], 'enderecos': ['enderecos']}
 
     @swagger_auto_schema(method='post', request_body=openapi.Schema(type=openapi.TYPE_OBJECT, properties={'email': openapi.Schema(type=openapi.TYPE_STRING)}), responses={200: openapi.Schema(type=openapi.TYPE_STRING)})
     @action(methods=['post'], detail=False)
@@ -69,10 +74,7 @@ class ClienteViewSet(viewsets.ModelViewSet):
             'uid': urlsafe_base64_encode(force_bytes(user.pk)),
             'token': account_activation_token.make_token(user),
         })
-        email = EmailMessage(
-            mail_subject, message, to=[to_email]
-        )
-        email.send()
+        enfileirar_email(mail_subject, message, [to_email])
         return Response({'message': 'A solicitação será enviada para o seu email.'})
 
     reset_body = openapi.Schema(type=openapi.TYPE_OBJECT,
@@ -141,6 +143,23 @@ class ClienteViewSet(viewsets.ModelViewSet):
         }
     )
 
+    foto_parameter = openapi.Parameter(name='foto', in_=openapi.IN_FORM, type=openapi.TYPE_FILE,
+                                       required=True, description='Imagem (multipart) ou base64 (JSON)')
+
+    @swagger_auto_schema(method='put', request_body=no_body, manual_parameters=[foto_parameter],
+                         responses={200: ClienteFotoSerializer}, auto_schema=MultipartSchema)
+    @action(methods=['put'], detail=True, parser_classes=[JSONParser, UploadMultiPartParser])
+    def foto(self, request, pk):
+        """
+        Troca a foto do cliente.
+        """
+        cliente = self.get_object()
+        serializer = ClienteFotoSerializer(
+            cliente, data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
     @action(methods=['get'], detail=True)
     def vendas(self, request, pk):
         """
@@ -148,7 +167,9 @@ class ClienteViewSet(viewsets.ModelViewSet):
         """
         try:
             cliente = self.get_object()
-            return list_response(self, VendaSerializer, cliente.vendas.all(), request)
+            vendas = prefetch_campos(cliente.vendas.all(), request, {'itens': ['itens']})
+            return list_response(self, VendaSerializer, vendas, request,
+                                 pagination_class=VendaPagination)
         except models.ObjectDoesNotExist:
             raise Http404
 
@@ -201,4 +222,5 @@ class ClienteViewSet(viewsets.ModelViewSet):
     @action(methods=['get'], detail=True)
     def avaliacoes(self, request, pk):
         cliente = self.get_object()
-        return list_response(self, AvaliacaoProdutoSerializer, cliente.avaliacoes_produto.all(), request)
+        return list_response(self, AvaliacaoProdutoSerializer, cliente.avaliacoes_produto.all(), request,
+                             pagination_class=AvaliacaoProdutoPagination)
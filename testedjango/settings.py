@@ -27,7 +27,7 @@ SECRET_KEY = config('SECRET_KEY')
 #DEBUG = True
 # SECURITY WARNING: don't run with debug turned on in production!
 #DEBUG = config('DEBUG', default=False, cast=bool)
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 ALLOWED_HOSTS = ['api-loja-django.herokuapp.com',
                  '192.168.137.1', '127.0.0.1', '192.168.15.87', '192.168.15.22', 'localhost']
 
@@ -51,7 +51,6 @@ INSTALLED_APPS = [
     'rest_framework',
     'drf_yasg',
     'corsheaders',
-    'debug_toolbar',
     'django_filters',
 
     # App
@@ -62,17 +61,43 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utils.middleware.InstrumentacaoMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
+# Instrumentação das requisições (utils.middleware): fração das requisições
+# em que as consultas e a renderização são medidas
+INSTRUMENTACAO_AMOSTRAGEM = config('INSTRUMENTACAO_AMOSTRAGEM', default=1.0, cast=float)
+
+# Endpoint /metrics (utils.metrics). Com vários workers, METRICAS_DIRETORIO é
+# um diretório compartilhado, esvaziado a cada deploy, onde cada processo
+# grava suas métricas a cada METRICAS_INTERVALO segundos.
+METRICAS_DIRETORIO = config('METRICAS_DIRETORIO', default=None)
+METRICAS_INTERVALO = 1
+METRICAS_TOKEN = config('METRICAS_TOKEN', default=None)
+# Sem o token, só staff logado ou estes IPs acessam o /metrics
+METRICAS_IPS = INTERNAL_IPS
+
+# Consultas lentas (utils.consultas_lentas, manage.py consultas_lentas): acima
+# de CONSULTAS_LENTAS_LIMITE_MS vão para o log e para o arquivo, com o plano
+# (EXPLAIN) numa fração delas
+CONSULTAS_LENTAS_LIMITE_MS = config('CONSULTAS_LENTAS_LIMITE_MS', default=200.0, cast=float)
+CONSULTAS_LENTAS_ARQUIVO = config(
+    'CONSULTAS_LENTAS_ARQUIVO', default=os.path.join(BASE_DIR, 'consultas_lentas.jsonl'))
+CONSULTAS_LENTAS_EXPLAIN_AMOSTRAGEM = 0.1
+
 ROOT_URLCONF = 'testedjango.urls'
 
 TEMPLATES = [
@@ -104,6 +129,28 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='loja-virtual'),
+    }
+}
+PRODUTOS_CACHE_TIMEOUT = 600
+# O índice de categorias em memória (website.bitmaps) é invalidado entre os
+# workers pelo cache acima, o que exige um backend compartilhado (Memcached,
+# Redis, banco). Com o LocMemCache, cada worker refaz o seu ao passar deste
+# número de segundos.
+INDICE_CATEGORIAS_TTL = config('INDICE_CATEGORIAS_TTL', default=60, cast=int)
+
+# Respostas para anônimos (utils.cache.cache_anonimo): validade em segundos e
+# tempo extra em que a resposta vencida ainda é servida enquanto é recalculada.
+RESPOSTAS_CACHE_TIMEOUT = 60
+RESPOSTAS_CACHE_TOLERANCIA = 30
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -226,17 +273,54 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATIC_URL = '/static/'
+# Arquivos comprimidos (gzip/brotli) e com hash no nome, servidos pelo
+# whitenoise com cache longo. Requer `collectstatic`.
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+
+# Quem envia os arquivos de mídia (utils.views.servir_media): 'django', 'nginx'
+# (X-Accel-Redirect para MEDIA_ACCEL_PREFIX) ou 'sendfile' (X-Sendfile).
+MEDIA_SERVIDOR = config('MEDIA_SERVIDOR', default='django')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+MEDIA_MAX_AGE = 86400
+
+# Versões redimensionadas das imagens (utils.imagens), geradas pela fila
+IMAGENS_FORMATO_PADRAO = 'jpeg'
+IMAGENS_QUALIDADE = 82
+
+# Uploads multipart (utils.uploads): gravados em disco, até este tamanho por arquivo
+UPLOAD_TAMANHO_MAXIMO = 10 * 1024 * 1024
 CORS_ORIGIN_ALLOW_ALL = True
 
 # django_heroku.settings(locals())
 
+EMAIL_BACKEND = config(
+    'EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_USE_TLS = True
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_HOST_USER = 'lojavirtual.ma9@gmail.com'
 EMAIL_HOST_PASSWORD = 'ma9*1234'
 EMAIL_PORT = 587
+# Caixa de saída (python manage.py enviar_emails)
+EMAILS_TAMANHO_LOTE = 50
 
 # Front-end
 FRONT_END_HOST = '192.168.15.126:4200'
+
+# Fila de tarefas (python manage.py processar_tarefas)
+TAREFAS_TAMANHO_LOTE = 100
+TAREFAS_TIMEOUT = 300
+
+# Idempotency-Key (website.idempotency): segundos após os quais uma reserva
+# sem resposta é considerada abandonada e pode ser retomada
+IDEMPOTENCIA_TTL_RESERVA = 60
+
+# Busca de produtos (website.search): resultados mais relevantes mantidos
+BUSCA_MAX_RESULTADOS = 1000
+
+# Exportação de vendas: linhas lidas do banco por vez
+EXPORTACAO_CHUNK_SIZE = 2000
+
+# Importação de produtos (manage.py importar_produtos): linhas por lote
+IMPORTACAO_TAMANHO_LOTE = 1000
@@ -1,8 +1,7 @@
 # Django
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
 # Rest Framework
@@ -18,6 +17,10 @@ from accounts.views import AccTokenObtainView
 
 # Utils
 from utils.schemas import schema_view
+from utils.views import metricas, servir_media
+
+# Others
+import re
 
 router = routers.DefaultRouter()
 router.register(r'clientes', accounts_viewsets.ClienteViewSet)
@@ -35,9 +38,12 @@ urlpatterns = [
     path('', include(router.urls)),
     path('login/', AccTokenObtainView.as_view(), name='login'),
     path('doc/', schema_view.with_ui('swagger', cache_timeout=0)),
+    path('metrics', metricas, name='metricas'),
+]
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            servir_media, name='media'),
 ]
-urlpatterns += static(settings.MEDIA_URL,
-                      document_root=settings.MEDIA_ROOT)
 if settings.DEBUG:
     import debug_toolbar
     urlpatterns = [
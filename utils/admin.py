@@ -1,3 +1,7 @@
 from django.contrib import admin
+from .models import Tarefa, MensagemEmail
 
 # Register your models here.
+
+admin.site.register(Tarefa)
+admin.site.register(MensagemEmail)
@@ -0,0 +1,142 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from .metrics import incrementar
+
+from functools import wraps
+import hashlib
+import time
+
+
+def versao(chave):
+    """
+    Versão atual guardada em `chave`. Se ainda não existe (ou foi expulsa do
+    cache), começa com um valor baseado no horário, para nunca repetir uma
+    versão usada antes.
+    """
+    valor = cache.get(chave)
+    if valor is None:
+        cache.add(chave, int(time.time() * 1000), None)
+        valor = cache.get(chave)
+    return valor
+
+
+def incrementar_versao(*chaves):
+    for chave in chaves:
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.add(chave, int(time.time() * 1000), None)
+
+
+def requisicao_anonima(request):
+    """
+    GET/HEAD sem credenciais: sem `Authorization` e sem cookie de sessão.
+    """
+    return (request.method in ('GET', 'HEAD') and
+            'HTTP_AUTHORIZATION' not in request.META and
+            settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+
+def chave_resposta(request, tags):
+    """
+    Chave da resposta: host, caminho, query string ordenada, `Accept` e a
+    versão atual de cada tag. Incrementar a versão de uma tag
+    (`incrementar_versao`) invalida todas as respostas que a usam.
+    """
+    query = sorted((k, v) for k in request.GET for v in request.GET.getlist(k))
+    texto = '|'.join([
+        request.get_host(),
+        request.path,
+        repr(query),
+        request.META.get('HTTP_ACCEPT', ''),
+        ':'.join('%s=%s' % (tag, versao(tag)) for tag in tags),
+    ])
+    return 'resposta:' + hashlib.md5(texto.encode('utf-8')).hexdigest()
+
+
+def aguardar_resposta(chave, espera, intervalo=0.05):
+    limite = time.time() + espera
+    while time.time() < limite:
+        time.sleep(intervalo)
+        entrada = cache.get(chave)
+        if entrada is not None:
+            return entrada
+    return None
+
+
+def resposta_da_entrada(request, entrada):
+    etag = entrada['headers'].get('ETag')
+    if etag:
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+    response = HttpResponse(entrada['conteudo'], status=entrada['status'])
+    for header, valor in entrada['headers'].items():
+        response[header] = valor
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def cache_anonimo(*tags, timeout=None, espera=2):
+    """
+    Guarda a resposta renderizada de requisições anônimas (ver
+    `requisicao_anonima`) de um método de viewset.
+
+    `tags` são chaves de versão (`versao`/`incrementar_versao`), ou funções
+    que recebem os kwargs da url e devolvem uma chave. Só respostas 200 são
+    guardadas, por `timeout` segundos. Vencida a resposta, um único processo
+    a recalcula (trava com `cache.add`) enquanto os outros continuam
+    servindo a versão antiga por até `RESPOSTAS_CACHE_TOLERANCIA` segundos;
+    sem versão antiga, esperam até `espera` segundos pelo resultado.
+    """
+    def decorator(metodo):
+        @wraps(metodo)
+        def wrapper(self, request, *args, **kwargs):
+            if not requisicao_anonima(request):
+                return metodo(self, request, *args, **kwargs)
+
+            validade = timeout or getattr(settings, 'RESPOSTAS_CACHE_TIMEOUT', 60)
+            tolerancia = getattr(settings, 'RESPOSTAS_CACHE_TOLERANCIA', 30)
+            chave = chave_resposta(
+                request, [tag(**kwargs) if callable(tag) else tag for tag in tags])
+            trava = chave + ':trava'
+
+            entrada = cache.get(chave)
+            if entrada is not None and entrada['expira'] > time.time():
+                incrementar('cache_consultas_total', cache='respostas', resultado='hit')
+                return resposta_da_entrada(request, entrada)
+            travado = cache.add(trava, 1, espera * 5)
+            if not travado:
+                # Outro processo já está recalculando.
+                if entrada is None:
+                    entrada = aguardar_resposta(chave, espera)
+                if entrada is not None:
+                    incrementar('cache_consultas_total', cache='respostas', resultado='hit')
+                    return resposta_da_entrada(request, entrada)
+            incrementar('cache_consultas_total', cache='respostas', resultado='miss')
+
+            try:
+                response = metodo(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    response = self.finalize_response(
+                        request, response, *args, **kwargs)
+                    response.render()
+                    headers = {header: valor for header, valor in response.items()
+                               if header.lower() != 'set-cookie'}
+                    cache.set(chave, {
+                        'conteudo': response.content,
+                        'status': response.status_code,
+                        'headers': headers,
+                        'expira': time.time() + validade,
+                    }, validade + tolerancia)
+                    response['X-Cache'] = 'MISS'
+            finally:
+                if travado:
+                    cache.delete(trava)
+            return response
+        return wrapper
+    return decorator
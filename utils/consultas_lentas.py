@@ -0,0 +1,166 @@
+# Django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+# Others
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# Frames ignorados ao procurar a origem da consulta
+IGNORADOS = (os.path.join('utils', 'consultas_lentas.py'),
+             os.path.join('utils', 'middleware.py'))
+
+
+def limite():
+    """
+    Duração mínima, em segundos, para a consulta ser registrada; `None`
+    desliga o registro.
+    """
+    limite_ms = getattr(settings, 'CONSULTAS_LENTAS_LIMITE_MS', None)
+    return None if limite_ms is None else limite_ms / 1000
+
+
+def origem():
+    """
+    Último frame do código do projeto (fora das bibliotecas) na pilha.
+    """
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if (frame.filename.startswith(base) and 'site-packages' not in frame.filename
+                and not frame.filename.endswith(IGNORADOS)):
+            return '%s:%d em %s' % (
+                os.path.relpath(frame.filename, base), frame.lineno, frame.name)
+    return None
+
+
+def explain(connection, sql, params):
+    """
+    Plano da consulta (só SELECTs), sem executá-la: `EXPLAIN QUERY PLAN` no
+    SQLite e `EXPLAIN` no Postgres.
+    """
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    if connection.vendor == 'sqlite':
+        prefixo = 'EXPLAIN QUERY PLAN '
+    elif connection.vendor == 'postgresql':
+        prefixo = 'EXPLAIN '
+    else:
+        return None
+    # Sem os execute_wrappers: o EXPLAIN não conta como consulta da requisição.
+    wrappers, connection.execute_wrappers = connection.execute_wrappers, []
+    try:
+        # Savepoint: um erro no EXPLAIN não pode abortar a transação da view.
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(prefixo + sql, params)
+            return [str(linha[-1]) for linha in cursor.fetchall()]
+    finally:
+        connection.execute_wrappers = wrappers
+
+
+def gravar(registro):
+    arquivo = getattr(settings, 'CONSULTAS_LENTAS_ARQUIVO', None)
+    if not arquivo:
+        return
+    linha = json.dumps(registro, cls=DjangoJSONEncoder, default=repr) + '\n'
+    with _lock, open(arquivo, 'a') as f:
+        f.write(linha)
+
+
+class RegistroConsultasLentas:
+    """
+    `execute_wrapper` que registra as consultas acima de `limite()`: SQL,
+    parâmetros, view (`endpoint`), frame de origem e, numa amostra
+    (`CONSULTAS_LENTAS_EXPLAIN_AMOSTRAGEM`), o plano da consulta. Os registros
+    vão para o log e, uma linha JSON por consulta, para
+    `CONSULTAS_LENTAS_ARQUIVO` (ver `manage.py consultas_lentas`).
+    """
+
+    def __init__(self, view=None):
+        self.view = view
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        resultado = execute(sql, params, many, context)
+        duracao = time.perf_counter() - inicio
+        minimo = limite()
+        if minimo is not None and duracao >= minimo:
+            self.registrar(context['connection'], sql, params, many, duracao)
+        return resultado
+
+    def registrar(self, connection, sql, params, many, duracao):
+        registro = {
+            'quando': timezone.now(),
+            'duracao_ms': round(duracao * 1000, 3),
+            'sql': sql,
+            'params': None if many else params,
+            'banco': connection.alias,
+            'view': self.view() if callable(self.view) else self.view,
+            'origem': origem(),
+            'explain': None,
+        }
+        amostragem = getattr(settings, 'CONSULTAS_LENTAS_EXPLAIN_AMOSTRAGEM', 0)
+        if not many and random.random() < amostragem:
+            try:
+                registro['explain'] = explain(connection, sql, params)
+            except Exception:
+                logger.exception('Erro no EXPLAIN da consulta lenta')
+        logger.warning('Consulta lenta (%.1f ms) em %s: %s', registro['duracao_ms'],
+                       registro['view'] or registro['origem'], sql)
+        try:
+            gravar(registro)
+        except OSError:
+            logger.exception('Erro ao gravar a consulta lenta')
+
+
+def normalizar(sql):
+    """
+    SQL agrupável: listas de parâmetros de `IN (...)` de tamanhos diferentes
+    contam como a mesma consulta.
+    """
+    return re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+
+
+def ler_registros(arquivo):
+    with open(arquivo) as f:
+        for linha in f:
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue
+
+
+def resumir(registros):
+    """
+    Consultas agrupadas por SQL normalizado, da maior para a menor duração
+    total.
+    """
+    grupos = {}
+    for registro in registros:
+        sql = normalizar(registro['sql'])
+        grupo = grupos.get(sql)
+        if grupo is None:
+            grupo = grupos[sql] = {
+                'sql': sql, 'quantidade': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'views': {}, 'origens': {}, 'explain': None,
+            }
+        grupo['quantidade'] += 1
+        grupo['total_ms'] += registro['duracao_ms']
+        grupo['max_ms'] = max(grupo['max_ms'], registro['duracao_ms'])
+        for campo, contagem in (('view', 'views'), ('origem', 'origens')):
+            if registro.get(campo):
+                grupo[contagem][registro[campo]] = grupo[contagem].get(registro[campo], 0) + 1
+        if registro.get('explain'):
+            grupo['explain'] = registro['explain']
+    return sorted(grupos.values(), key=lambda grupo: grupo['total_ms'], reverse=True)
@@ -1,4 +1,9 @@
+from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+
+from .imagens import formato_pedido, url_derivado
 
 def get_fields(data, fields):
     res = []
@@ -11,4 +16,38 @@ def get_fields(data, fields):
             errors.append('O campo ' + field + ' é obrigatório')
     if errors:
         raise ValidationError(errors)
-    return res
\ No newline at end of file
+    return res
+
+class ImagemField(Base64ImageField):
+    """
+    Aceita tanto o arquivo enviado em multipart quanto a string base64 (mantida
+    por compatibilidade com os clientes que enviam JSON).
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return serializers.ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
+class ImagemDerivadaField(ImagemField):
+    """
+    `ImagemField` que, na leitura, devolve a URL da versão
+    redimensionada `tamanho` (ver `utils.imagens`) quando ela já foi gerada,
+    e a do original enquanto isso. O formato é o de
+    `IMAGENS_FORMATO_PADRAO`, ou o pedido em `?imagem_formato=webp`.
+    """
+
+    def __init__(self, *args, tamanho='card', **kwargs):
+        self.tamanho = tamanho
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, value):
+        instance = getattr(value, 'instance', None)
+        if not value or not getattr(instance, 'derivados_gerados', False):
+            return super().to_representation(value)
+        request = self.context.get('request', None)
+        url = url_derivado(value, self.tamanho, formato_pedido(request))
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
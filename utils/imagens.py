@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from PIL import Image, ImageOps, features
+
+import io
+import posixpath
+
+TAMANHOS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'zoom': (1600, 1600),
+}
+
+FORMATOS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+}
+
+
+def get_tamanhos():
+    return getattr(settings, 'IMAGENS_TAMANHOS', TAMANHOS)
+
+
+def formatos_disponiveis():
+    return [formato for formato in FORMATOS
+            if formato != 'webp' or features.check('webp')]
+
+
+def formato_pedido(request):
+    """
+    Formato dos derivados para a requisição: o de `?imagem_formato=`, se
+    disponível, ou `IMAGENS_FORMATO_PADRAO`. Caches de respostas com URLs de
+    derivados devem incluí-lo na chave.
+    """
+    if request is not None:
+        pedido = getattr(request, 'query_params', request.GET).get('imagem_formato')
+        if pedido in formatos_disponiveis():
+            return pedido
+    return getattr(settings, 'IMAGENS_FORMATO_PADRAO', 'jpeg')
+
+
+def nome_derivado(nome, tamanho, formato):
+    """
+    `website/images/x.png` -> `website/images/derivados/x_card.jpg`
+    """
+    diretorio, arquivo = posixpath.split(nome)
+    base = posixpath.splitext(arquivo)[0]
+    return posixpath.join(diretorio, 'derivados', '%s_%s.%s' % (
+        base, tamanho, FORMATOS[formato][1]))
+
+
+def nomes_derivados(nome):
+    return [nome_derivado(nome, tamanho, formato)
+            for tamanho in get_tamanhos() for formato in FORMATOS]
+
+
+def url_derivado(arquivo, tamanho, formato='jpeg'):
+    return arquivo.storage.url(nome_derivado(arquivo.name, tamanho, formato))
+
+
+def codificar(imagem, formato):
+    pil_formato = FORMATOS[formato][0]
+    if pil_formato == 'JPEG' and imagem.mode != 'RGB':
+        if imagem.mode in ('RGBA', 'LA', 'P'):
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            fundo.paste(imagem, mask=imagem.split()[-1])
+            imagem = fundo
+        else:
+            imagem = imagem.convert('RGB')
+    buffer = io.BytesIO()
+    qualidade = getattr(settings, 'IMAGENS_QUALIDADE', 82)
+    if pil_formato == 'JPEG':
+        imagem.save(buffer, pil_formato, quality=qualidade, optimize=True, progressive=True)
+    else:
+        imagem.save(buffer, pil_formato, quality=qualidade, method=4)
+    return buffer.getvalue()
+
+
+def gerar_derivados(arquivo):
+    """
+    Gera, no mesmo storage do original, uma versão de cada tamanho de
+    `get_tamanhos()` em cada formato disponível. Imagens menores que o
+    tamanho pedido não são ampliadas.
+    """
+    storage = arquivo.storage
+    with arquivo.open('rb') as f:
+        original = Image.open(f)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() or
+                                    original.mode == 'P' else 'RGB')
+    # Com o nome pelo conteúdo (utils.storage), derivados existentes já são
+    # desta mesma imagem.
+    por_conteudo = getattr(storage, 'enderecado_por_conteudo', False)
+    nomes = []
+    for tamanho, caixa in get_tamanhos().items():
+        imagem = None
+        for formato in formatos_disponiveis():
+            nome = nome_derivado(arquivo.name, tamanho, formato)
+            if por_conteudo and storage.exists(nome):
+                nomes.append(nome)
+                continue
+            if imagem is None:
+                imagem = original.copy()
+                imagem.thumbnail(caixa, Image.LANCZOS)
+            conteudo = ContentFile(codificar(imagem, formato))
+            if por_conteudo:
+                nomes.append(storage.gravar(nome, conteudo))
+            else:
+                if storage.exists(nome):
+                    storage.delete(nome)
+                nomes.append(storage.save(nome, conteudo))
+    return nomes
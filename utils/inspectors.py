@@ -2,9 +2,22 @@ from drf_yasg.inspectors import PaginatorInspector
 from drf_yasg import openapi
 from collections import OrderedDict
 
+from .pagination import KeysetPagination
+
 
 class PageNumberPaginatorInspectorClass(PaginatorInspector):
     def get_paginated_response(self, paginator, response_schema):
+        if isinstance(paginator, KeysetPagination):
+            return openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties=OrderedDict((
+                    ('next', openapi.Schema(type=openapi.TYPE_STRING)),
+                    ('previous', openapi.Schema(type=openapi.TYPE_STRING)),
+                    ('count', openapi.Schema(type=openapi.TYPE_INTEGER)),
+                    ('results', response_schema)
+                )),
+                required=['results']
+            )
         paged_schema = openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties=OrderedDict((
@@ -0,0 +1,76 @@
+# Django
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+# Utils
+from .models import MensagemEmail
+from .tasks import backoff, reservar_lote
+
+# Others
+import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def enfileirar_email(assunto, corpo, destinatarios, remetente=''):
+    """
+    Guarda a mensagem já renderizada na caixa de saída. O envio é feito
+    pelo comando `enviar_emails`.
+    """
+    return MensagemEmail.objects.create(
+        assunto=assunto, corpo=corpo, remetente=remetente or '',
+        destinatarios=','.join(destinatarios))
+
+
+def enviar_lote(limite=None):
+    """
+    Envia um lote da caixa de saída reutilizando uma única conexão com o
+    servidor de email. Retorna a quantidade de mensagens processadas.
+    """
+    limite = limite or getattr(settings, 'EMAILS_TAMANHO_LOTE', 50)
+    mensagens = reservar_lote(limite, model=MensagemEmail)
+    if not mensagens:
+        return 0
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        logger.exception('Falha ao conectar ao servidor de email')
+        for mensagem in mensagens:
+            falhar(mensagem, 'Falha ao conectar ao servidor de email')
+        return len(mensagens)
+
+    try:
+        for mensagem in mensagens:
+            email = EmailMessage(
+                mensagem.assunto, mensagem.corpo,
+                from_email=mensagem.remetente or None,
+                to=mensagem.destinatarios.split(','),
+                connection=connection)
+            try:
+                email.send()
+            except Exception as e:
+                logger.exception('Falha ao enviar o email %s', mensagem.pk)
+                falhar(mensagem, str(e))
+            else:
+                mensagem.status = MensagemEmail.ENVIADA
+                mensagem.enviada_em = timezone.now()
+                mensagem.erro = ''
+                mensagem.save()
+    finally:
+        connection.close()
+    return len(mensagens)
+
+
+def falhar(mensagem, erro):
+    mensagem.erro = erro
+    if mensagem.tentativas >= mensagem.max_tentativas:
+        mensagem.status = MensagemEmail.FALHA
+    else:
+        mensagem.status = MensagemEmail.PENDENTE
+        mensagem.disponivel_em = timezone.now() + datetime.timedelta(
+            seconds=backoff(mensagem.tentativas))
+    mensagem.save()
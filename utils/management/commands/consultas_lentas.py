@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from utils.consultas_lentas import ler_registros, resumir
+
+import os
+
+
+class Command(BaseCommand):
+    help = 'Resume as consultas lentas registradas, por tempo total'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--arquivo', default=None,
+                            help='Arquivo de registros (padrão: CONSULTAS_LENTAS_ARQUIVO)')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Quantidade de consultas listadas')
+        parser.add_argument('--explain', action='store_true',
+                            help='Mostra o plano capturado de cada consulta')
+
+    def handle(self, *args, **options):
+        arquivo = options['arquivo'] or getattr(settings, 'CONSULTAS_LENTAS_ARQUIVO', None)
+        if not arquivo or not os.path.exists(arquivo):
+            raise CommandError('Arquivo de consultas lentas não encontrado: %s' % arquivo)
+
+        grupos = resumir(ler_registros(arquivo))
+        if not grupos:
+            self.stdout.write('Nenhuma consulta lenta registrada')
+            return
+        for posicao, grupo in enumerate(grupos[:options['top']], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                '%d. total %.1f ms, %d vez(es), média %.1f ms, máximo %.1f ms' % (
+                    posicao, grupo['total_ms'], grupo['quantidade'],
+                    grupo['total_ms'] / grupo['quantidade'], grupo['max_ms'])))
+            self.stdout.write('   ' + grupo['sql'])
+            for titulo, campo in (('views', 'views'), ('origens', 'origens')):
+                if grupo[campo]:
+                    frequentes = sorted(grupo[campo].items(), key=lambda item: -item[1])[:3]
+                    self.stdout.write('   %s: %s' % (titulo, ', '.join(
+                        '%s (%d)' % item for item in frequentes)))
+            if options['explain'] and grupo['explain']:
+                for linha in grupo['explain']:
+                    self.stdout.write('     ' + linha)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from utils.mail import enviar_lote
+
+import time
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails pendentes da caixa de saída em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Quantidade de emails por lote')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua aguardando novos emails quando a caixa de saída esvazia')
+        parser.add_argument('--intervalo', type=float, default=5.0,
+                            help='Segundos de espera quando a caixa de saída está vazia')
+
+    def handle(self, *args, **options):
+        while True:
+            n = enviar_lote(options['lote'])
+            if n:
+                self.stdout.write('%d email(s) processado(s)' % n)
+            elif options['continuo']:
+                time.sleep(options['intervalo'])
+            else:
+                break
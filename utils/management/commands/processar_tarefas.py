@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from utils.tasks import processar_lote
+
+import time
+
+
+class Command(BaseCommand):
+    help = 'Processa as tarefas pendentes da fila em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Quantidade de tarefas por lote')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Continua aguardando novas tarefas quando a fila esvazia')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera quando a fila está vazia')
+
+    def handle(self, *args, **options):
+        while True:
+            n = processar_lote(options['lote'])
+            if n:
+                self.stdout.write('%d tarefa(s) processada(s)' % n)
+            elif options['continuo']:
+                time.sleep(options['intervalo'])
+            else:
+                break
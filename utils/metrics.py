@@ -0,0 +1,284 @@
+from django.conf import settings
+
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+# Limites (em segundos) dos buckets dos histogramas de tempo
+BUCKETS_TEMPO = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+# Limites dos histogramas de contagem (ex.: consultas por requisição)
+BUCKETS_CONTAGEM = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+_contadores = {}
+_histogramas = {}
+_gauges = {}
+_persistido_em = 0.0
+
+PREFIXO = 'loja_'
+
+
+class Histograma:
+    """
+    Histograma cumulativo no formato do Prometheus: `contagens[i]` é o
+    número de observações `<= buckets[i]`; `total` inclui as acima do último.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.contagens = [0] * len(self.buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _chave(nome, labels):
+    return nome, tuple(sorted(labels.items()))
+
+
+def incrementar(nome, valor=1, **labels):
+    chave = _chave(nome, labels)
+    with _lock:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def observar(nome, valor, buckets=BUCKETS_TEMPO, **labels):
+    chave = _chave(nome, labels)
+    with _lock:
+        histograma = _histogramas.get(chave)
+        if histograma is None:
+            histograma = _histogramas[chave] = Histograma(buckets)
+        histograma.observar(valor)
+
+
+def definir(nome, valor, **labels):
+    """
+    Valor atual (gauge). Na agregação entre processos cada processo vivo
+    aparece com o label `pid`.
+    """
+    with _lock:
+        _gauges[_chave(nome, labels)] = valor
+
+
+def coletar():
+    """
+    Cópia das métricas deste processo: `{'contadores': {(nome, labels): valor},
+    'histogramas': {(nome, labels): Histograma}, 'gauges': {...}}`.
+    """
+    with _lock:
+        histogramas = {}
+        for chave, histograma in _histogramas.items():
+            copia = Histograma(histograma.buckets)
+            copia.contagens = list(histograma.contagens)
+            copia.soma, copia.total = histograma.soma, histograma.total
+            histogramas[chave] = copia
+        return {'contadores': dict(_contadores), 'histogramas': histogramas,
+                'gauges': dict(_gauges)}
+
+
+def limpar():
+    with _lock:
+        _contadores.clear()
+        _histogramas.clear()
+        _gauges.clear()
+
+
+# Vários processos (workers do gunicorn)
+#
+# Com `METRICAS_DIRETORIO` definido, cada processo grava suas métricas em
+# `<diretorio>/<pid>-<início>.json` (no máximo a cada `METRICAS_INTERVALO`
+# segundos) e o endpoint soma os arquivos de todos. O início do processo no
+# nome evita que um worker novo que recebeu o pid de um que já terminou
+# sobrescreva os contadores dele. O diretório deve ser esvaziado a cada
+# deploy, antes de subir os workers.
+
+_processo = None
+
+
+def diretorio():
+    return getattr(settings, 'METRICAS_DIRETORIO', None)
+
+
+def processo():
+    """
+    `(pid, início em ms)` deste processo. Calculado no primeiro uso depois
+    do fork, já que os workers herdam o módulo carregado pelo master.
+    """
+    global _processo
+    pid = os.getpid()
+    if _processo is None or _processo[0] != pid:
+        _processo = (pid, int(time.time() * 1000))
+    return _processo
+
+
+def _serializar(dados):
+    return {
+        'contadores': [[nome, dict(labels), valor]
+                       for (nome, labels), valor in dados['contadores'].items()],
+        'histogramas': [[nome, dict(labels), h.buckets, h.contagens, h.soma, h.total]
+                        for (nome, labels), h in dados['histogramas'].items()],
+        'gauges': [[nome, dict(labels), valor]
+                   for (nome, labels), valor in dados['gauges'].items()],
+    }
+
+
+def persistir(forcar=False):
+    global _persistido_em
+    pasta = diretorio()
+    agora = time.time()
+    if not pasta or (not forcar and
+                     agora - _persistido_em < getattr(settings, 'METRICAS_INTERVALO', 1)):
+        return
+    _persistido_em = agora
+    os.makedirs(pasta, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    with os.fdopen(fd, 'w') as arquivo:
+        json.dump(_serializar(coletar()), arquivo)
+    os.replace(temporario, os.path.join(pasta, '%d-%d.json' % processo()))
+
+
+def processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def agregar():
+    """
+    Métricas de todos os processos: os contadores e histogramas são somados
+    (inclusive os de processos que já terminaram, para não voltarem atrás);
+    os gauges só dos processos vivos, com o label `pid`.
+    """
+    proprio = processo()
+    arquivos = {proprio: _serializar(coletar())}
+    pasta = diretorio()
+    if pasta and os.path.isdir(pasta):
+        for nome in os.listdir(pasta):
+            base, extensao = os.path.splitext(nome)
+            pid, _, inicio = base.partition('-')
+            if extensao != '.json' or not pid.isdigit() or not inicio.isdigit():
+                continue
+            chave = (int(pid), int(inicio))
+            if chave == proprio:
+                continue
+            try:
+                with open(os.path.join(pasta, nome)) as arquivo:
+                    arquivos[chave] = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+    # Com o pid reaproveitado, só o processo que começou por último pode
+    # estar vivo.
+    ultimos = {}
+    for pid, inicio in arquivos:
+        ultimos[pid] = max(inicio, ultimos.get(pid, inicio))
+
+    contadores, histogramas, gauges = {}, {}, {}
+    for (pid, inicio), dados in arquivos.items():
+        for nome, labels, valor in dados['contadores']:
+            chave = _chave(nome, labels)
+            contadores[chave] = contadores.get(chave, 0) + valor
+        for nome, labels, buckets, contagens, soma, total in dados['histogramas']:
+            chave = _chave(nome, labels)
+            histograma = histogramas.get(chave)
+            if histograma is None:
+                histograma = histogramas[chave] = Histograma(buckets)
+            if list(histograma.buckets) != list(buckets):
+                continue
+            histograma.contagens = [a + b for a, b in zip(histograma.contagens, contagens)]
+            histograma.soma += soma
+            histograma.total += total
+        if (pid, inicio) == proprio or (ultimos[pid] == inicio and processo_vivo(pid)):
+            for nome, labels, valor in dados['gauges']:
+                gauges[_chave(nome, dict(labels, pid=str(pid)))] = valor
+    return {'contadores': contadores, 'histogramas': histogramas, 'gauges': gauges}
+
+
+# Formato texto do Prometheus
+
+def _numero(valor):
+    if valor == math.inf:
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _labels(labels, extra=()):
+    pares = list(labels) + list(extra)
+    if not pares:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (nome, str(valor).replace('\\', '\\\\').replace('"', '\\"')
+                     .replace('\n', '\\n'))
+        for nome, valor in pares)
+
+
+def taxas_acerto(contadores):
+    """
+    `{cache: acertos / consultas}` a partir de `cache_consultas_total`.
+    """
+    acertos, consultas = {}, {}
+    for (nome, labels), valor in contadores.items():
+        if nome != 'cache_consultas_total':
+            continue
+        labels = dict(labels)
+        cache = labels.get('cache')
+        consultas[cache] = consultas.get(cache, 0) + valor
+        if labels.get('resultado') == 'hit':
+            acertos[cache] = acertos.get(cache, 0) + valor
+    return {cache: acertos.get(cache, 0) / total
+            for cache, total in consultas.items() if total}
+
+
+def texto_prometheus(dados):
+    linhas = []
+
+    def agrupar(metricas):
+        grupos = {}
+        for (nome, labels), valor in sorted(metricas.items()):
+            grupos.setdefault(nome, []).append((labels, valor))
+        return grupos.items()
+
+    for nome, series in agrupar(dados['contadores']):
+        linhas.append('# TYPE %s%s counter' % (PREFIXO, nome))
+        for labels, valor in series:
+            linhas.append('%s%s%s %s' % (PREFIXO, nome, _labels(labels), _numero(valor)))
+
+    gauges = dict(dados['gauges'])
+    for cache, taxa in taxas_acerto(dados['contadores']).items():
+        gauges[_chave('cache_taxa_acerto', {'cache': cache})] = taxa
+    agora = time.time()
+    for (nome, labels), valor in dados['gauges'].items():
+        if nome == 'recomendador_treinado_em_segundos':
+            gauges['recomendador_idade_segundos', labels] = agora - valor
+    for nome, series in agrupar(gauges):
+        linhas.append('# TYPE %s%s gauge' % (PREFIXO, nome))
+        for labels, valor in series:
+            linhas.append('%s%s%s %s' % (PREFIXO, nome, _labels(labels), _numero(valor)))
+
+    for nome, series in agrupar(dados['histogramas']):
+        linhas.append('# TYPE %s%s histogram' % (PREFIXO, nome))
+        for labels, histograma in series:
+            for limite, contagem in zip(histograma.buckets, histograma.contagens):
+                linhas.append('%s%s_bucket%s %s' % (
+                    PREFIXO, nome, _labels(labels, [('le', _numero(limite))]), contagem))
+            linhas.append('%s%s_bucket%s %s' % (
+                PREFIXO, nome, _labels(labels, [('le', '+Inf')]), histograma.total))
+            linhas.append('%s%s_sum%s %s' % (
+                PREFIXO, nome, _labels(labels), _numero(histograma.soma)))
+            linhas.append('%s%s_count%s %s' % (
+                PREFIXO, nome, _labels(labels), histograma.total))
+    return '\n'.join(linhas) + '\n'
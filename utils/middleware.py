@@ -0,0 +1,112 @@
+# Django
+from django.conf import settings
+from django.db import connections
+
+# Utils
+from . import metrics
+from .consultas_lentas import RegistroConsultasLentas, limite
+
+# Others
+from contextlib import ExitStack
+import random
+import time
+
+
+def endpoint(request):
+    """
+    Nome da rota atendida: `<basename>-<action>` nas rotas do router do DRF
+    (`produto-list`, `carrinho-compra`), o nome da url ou da view nas demais.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'sem_rota'
+    return match.url_name or match.view_name or match._func_path
+
+
+def somar_serializacao(request, segundos):
+    """
+    Soma `segundos` ao tempo de serialização da requisição, se ela estiver
+    sendo medida (ver `CamposDinamicosMixin`). Aceita a `Request` do DRF.
+    """
+    request = getattr(request, '_request', request)
+    if getattr(request, '_tempo_serializacao', None) is not None:
+        request._tempo_serializacao += segundos
+
+
+class MedicaoConsultas:
+    """
+    `execute_wrapper` que conta as consultas e soma o tempo gasto nelas.
+    """
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+class InstrumentacaoMiddleware:
+    """
+    Mede cada requisição: contagem e latência total de todas, e numa amostra
+    (`INSTRUMENTACAO_AMOSTRAGEM`, de 0 a 1) também as consultas ao banco, o
+    tempo dos serializers (incluindo as consultas feitas por eles) e o de
+    renderização da resposta. Os valores vão para os histogramas de
+    `utils.metrics` e, nas requisições amostradas, para o header
+    `Server-Timing`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        amostrada = random.random() < getattr(settings, 'INSTRUMENTACAO_AMOSTRAGEM', 1.0)
+        wrappers = []
+        if limite() is not None:
+            # Todas as requisições: as consultas lentas não são amostradas. Fica
+            # por fora, para o registro não entrar no tempo de `medicao`.
+            wrappers.append(RegistroConsultasLentas(lambda: endpoint(request)))
+        if amostrada:
+            medicao = request._medicao_consultas = MedicaoConsultas()
+            request._tempo_serializacao = 0.0
+            wrappers.append(medicao)
+        inicio = time.perf_counter()
+        with ExitStack() as stack:
+            for wrapper in wrappers:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+            response = self.get_response(request)
+        fim = time.perf_counter()
+        total = fim - inicio
+
+        nome = endpoint(request)
+        metrics.incrementar('requisicoes_total', endpoint=nome,
+                            metodo=request.method, status=str(response.status_code))
+        metrics.observar('requisicao_segundos', total, endpoint=nome)
+        if amostrada:
+            inicio_render = getattr(request, '_inicio_render', None)
+            render = fim - inicio_render if inicio_render is not None else 0.0
+            metrics.observar('consultas_por_requisicao', medicao.consultas,
+                             buckets=metrics.BUCKETS_CONTAGEM, endpoint=nome)
+            metrics.observar('consultas_segundos', medicao.tempo, endpoint=nome)
+            metrics.observar('serializacao_segundos', request._tempo_serializacao,
+                             endpoint=nome)
+            metrics.observar('render_segundos', render, endpoint=nome)
+            response['Server-Timing'] = ', '.join([
+                'db;desc="%d consultas";dur=%.1f' % (medicao.consultas, medicao.tempo * 1000),
+                'serializacao;dur=%.1f' % (request._tempo_serializacao * 1000),
+                'render;dur=%.1f' % (render * 1000),
+                'total;dur=%.1f' % (total * 1000),
+            ])
+        metrics.persistir()
+        return response
+
+    def process_template_response(self, request, response):
+        # A resposta do DRF é renderizada logo depois deste hook.
+        request._inicio_render = time.perf_counter()
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:06
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensagemEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('update_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('assunto', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('corpo', models.TextField(verbose_name='Corpo')),
+                ('remetente', models.CharField(blank=True, default='', max_length=255, verbose_name='Remetente')),
+                ('destinatarios', models.TextField(verbose_name='Destinatários')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSANDO', 'Processando'), ('ENVIADA', 'Enviada'), ('FALHA', 'Falha')], default='PENDENTE', max_length=12, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveIntegerField(default=5, verbose_name='Máximo de tentativas')),
+                ('disponivel_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Disponível em')),
+                ('enviada_em', models.DateTimeField(blank=True, null=True, verbose_name='Enviada em')),
+                ('erro', models.TextField(blank=True, default='', verbose_name='Erro')),
+            ],
+            options={
+                'verbose_name': 'Mensagem de email',
+                'verbose_name_plural': 'Mensagens de email',
+                'ordering': ['disponivel_em', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mensagememail',
+            index=models.Index(fields=['status', 'disponivel_em'], name='utils_mensa_status_251043_idx'),
+        ),
+    ]
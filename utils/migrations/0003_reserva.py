@@ -0,0 +1,23 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0002_auto_20261019_1706'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensagememail',
+            name='reserva',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Reserva'),
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='reserva',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Reserva'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
@@ -9,3 +10,102 @@ class ModelLog(models.Model):
 
     class Meta:
         abstract = True
+
+
+class ModelImagem(models.Model):
+    """
+    Modelo com uma imagem que tem versões redimensionadas (ver
+    `utils.imagens`). `CAMPO_IMAGEM` é o nome do `ImageField`;
+    `derivados_gerados` volta a `False` sempre que o arquivo muda.
+    """
+    CAMPO_IMAGEM = None
+
+    derivados_gerados = models.BooleanField(
+        'Derivados gerados', default=False, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._imagem_carregada = instance.__dict__.get(cls.CAMPO_IMAGEM)
+        return instance
+
+    @property
+    def arquivo_imagem(self):
+        return getattr(self, self.CAMPO_IMAGEM)
+
+    @property
+    def imagem_alterada(self):
+        nome = self.arquivo_imagem.name if self.arquivo_imagem else None
+        carregada = getattr(self, '_imagem_carregada', None)
+        return nome != getattr(carregada, 'name', carregada)
+
+
+class Tarefa(ModelLog):
+    PENDENTE = 'PENDENTE'
+    PROCESSANDO = 'PROCESSANDO'
+    CONCLUIDA = 'CONCLUIDA'
+    FALHA = 'FALHA'
+    STATUS = ((PENDENTE, 'Pendente'),
+              (PROCESSANDO, 'Processando'),
+              (CONCLUIDA, 'Concluída'),
+              (FALHA, 'Falha'))
+
+    nome = models.CharField('Nome', max_length=100)
+    payload = models.TextField('Payload', default='{}')
+    status = models.CharField(
+        'Status', max_length=12, choices=STATUS, default=PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    max_tentativas = models.PositiveIntegerField(
+        'Máximo de tentativas', default=5)
+    disponivel_em = models.DateTimeField('Disponível em', default=timezone.now)
+    reserva = models.CharField(
+        'Reserva', max_length=32, blank=True, default='', editable=False)
+    erro = models.TextField('Erro', blank=True, default='')
+
+    def __str__(self):
+        return str(self.pk) + ' - ' + self.nome + ' - ' + self.status
+
+    class Meta:
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        ordering = ['disponivel_em', 'id']
+        indexes = [models.Index(fields=['status', 'disponivel_em'])]
+
+
+class MensagemEmail(ModelLog):
+    PENDENTE = 'PENDENTE'
+    PROCESSANDO = 'PROCESSANDO'
+    ENVIADA = 'ENVIADA'
+    FALHA = 'FALHA'
+    STATUS = ((PENDENTE, 'Pendente'),
+              (PROCESSANDO, 'Processando'),
+              (ENVIADA, 'Enviada'),
+              (FALHA, 'Falha'))
+
+    assunto = models.CharField('Assunto', max_length=255)
+    corpo = models.TextField('Corpo')
+    remetente = models.CharField(
+        'Remetente', max_length=255, blank=True, default='')
+    destinatarios = models.TextField('Destinatários')
+    status = models.CharField(
+        'Status', max_length=12, choices=STATUS, default=PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default=0)
+    max_tentativas = models.PositiveIntegerField(
+        'Máximo de tentativas', default=5)
+    disponivel_em = models.DateTimeField('Disponível em', default=timezone.now)
+    enviada_em = models.DateTimeField('Enviada em', null=True, blank=True)
+    reserva = models.CharField(
+        'Reserva', max_length=32, blank=True, default='', editable=False)
+    erro = models.TextField('Erro', blank=True, default='')
+
+    def __str__(self):
+        return self.destinatarios + ' - ' + self.assunto + ' - ' + self.status
+
+    class Meta:
+        verbose_name = 'Mensagem de email'
+        verbose_name_plural = 'Mensagens de email'
+        ordering = ['disponivel_em', 'id']
+        indexes = [models.Index(fields=['status', 'disponivel_em'])]
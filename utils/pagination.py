@@ -1,10 +1,169 @@
-from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import versao
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import partial
+import coreapi
+import coreschema
+import datetime
+import hashlib
+import json
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+
+
+def assinatura_queryset(queryset):
+    sql, params = queryset.query.sql_with_params()
+    texto = queryset.db + sql + repr(params)
+    return hashlib.md5(texto.encode('utf-8')).hexdigest()
+
+
+def contagem_em_cache(queryset, timeout, tags=()):
+    """
+    `tags` são chaves de versão (`utils.cache.versao`): incrementar a versão
+    de uma delas descarta as contagens guardadas.
+    """
+    chave = 'contagem:' + assinatura_queryset(queryset)
+    if tags:
+        chave += ':' + ':'.join('%s=%s' % (tag, versao(tag)) for tag in tags)
+    count = cache.get(chave)
+    if count is None:
+        count = queryset.count()
+        cache.set(chave, count, timeout)
+    return count
+
+
+def contagem_estimada(queryset, timeout, tags=(), limiar_exato=1000):
+    """
+    Usa a estimativa de linhas do planejador do Postgres. Estimativas
+    pequenas são imprecisas e baratas de conferir, então abaixo de
+    `limiar_exato` a contagem é exata. Nos outros bancos (SQLite) recorre
+    à contagem em cache.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return contagem_em_cache(queryset, timeout, tags)
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plano = cursor.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    estimativa = int(plano[0]['Plan']['Plan Rows'])
+    if estimativa < limiar_exato:
+        return contagem_em_cache(queryset, timeout, tags)
+    return estimativa
+
+
+def contar(queryset, estrategia=EXACT, timeout=60, tags=()):
+    if not hasattr(queryset, 'query'):
+        return len(queryset)
+    try:
+        if estrategia == CACHED:
+            return contagem_em_cache(queryset, timeout, tags)
+        if estrategia == ESTIMATED:
+            return contagem_estimada(queryset, timeout, tags)
+    except EmptyResultSet:
+        return 0
+    return queryset.count()
+
+
+class PaginaContagem(Page):
+
+    def __init__(self, object_list, number, paginator, tem_proxima):
+        super().__init__(object_list, number, paginator)
+        self.tem_proxima = tem_proxima
+
+    def has_next(self):
+        return self.tem_proxima
+
+
+class ContagemPaginator(Paginator):
+    """
+    Paginator com a contagem de `contar`. Fora da estratégia exata, a
+    contagem pode estar defasada: ela só é exibida, e as páginas são obtidas
+    buscando `per_page + 1` linhas, de modo que a existência da próxima
+    página (e a própria página pedida) não dependem dela.
+    """
+
+    def __init__(self, *args, estrategia=EXACT, timeout=60, tags=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estrategia = estrategia
+        self.timeout = timeout
+        self.tags = tags
+        self.minimo = 0
+
+    @cached_property
+    def contagem(self):
+        return contar(self.object_list, self.estrategia, self.timeout, self.tags)
+
+    @property
+    def count(self):
+        # Nunca menos do que as linhas que já se sabe existirem.
+        return max(self.contagem, self.minimo)
+
+    def validate_number(self, number):
+        if self.estrategia == EXACT:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        if self.estrategia == EXACT:
+            return super().page(number)
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        linhas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        if not linhas and number > 1:
+            raise EmptyPage('That page contains no results')
+        tem_proxima = len(linhas) > self.per_page
+        linhas = linhas[:self.per_page]
+        self.minimo = inicio + len(linhas) + (1 if tem_proxima else 0)
+        return PaginaContagem(linhas, number, self, tem_proxima)
 
 
 class WebsitePagination(pagination.PageNumberPagination):
+    """
+    Paginação por número de página. A estratégia de contagem do total pode
+    ser escolhida por viewset com o atributo `count_strategy`:
+
+    - `exact`: `COUNT(*)` a cada requisição (padrão);
+    - `cached`: contagem guardada em cache por `count_timeout` segundos,
+      chaveada pelo SQL da consulta filtrada e pelas versões das chaves de
+      `count_cache_tags`;
+    - `estimated`: estimativa do planejador no Postgres (cache no SQLite).
+    """
     page_size_query_param = 'limit'
+    count_strategy = EXACT
+    count_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            ContagemPaginator,
+            estrategia=getattr(view, 'count_strategy', self.count_strategy),
+            timeout=getattr(view, 'count_timeout', self.count_timeout),
+            tags=getattr(view, 'count_cache_tags', ()))
+        return super().paginate_queryset(queryset, request, view=view)
 
     def get_paginated_response(self, data):
         return Response({
@@ -14,3 +173,181 @@ class WebsitePagination(pagination.PageNumberPagination):
             'total_pages': self.page.paginator.num_pages,
             'results': data
         })
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Paginação por chave (keyset) sobre os campos de `ordering`, que devem
+    identificar unicamente cada linha (o último campo normalmente é o `id`).
+
+    Cada página é obtida com um `WHERE (campos) > (última posição)` em vez de
+    `OFFSET`, então páginas profundas custam o mesmo que a primeira. O total
+    só é calculado quando o cliente pede `?count=true`, usando a mesma
+    estratégia de contagem (`count_strategy`) de `WebsitePagination`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Cursor inválido'
+    count_strategy = EXACT
+    count_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if self.include_count(request):
+            self.count = contar(
+                queryset,
+                getattr(view, 'count_strategy', self.count_strategy),
+                getattr(view, 'count_timeout', self.count_timeout),
+                getattr(view, 'count_cache_tags', ()))
+
+        posicao, reverso = self.decode_cursor(request, queryset.model)
+        ordering = self.ordering
+        if reverso:
+            ordering = [self.inverter(campo) for campo in ordering]
+        queryset = queryset.order_by(*ordering)
+        if posicao is not None:
+            queryset = queryset.filter(self.filtro_keyset(ordering, posicao))
+
+        resultados = list(queryset[:self.page_size + 1])
+        tem_mais = len(resultados) > self.page_size
+        resultados = resultados[:self.page_size]
+        if reverso:
+            resultados.reverse()
+            tem_proxima, tem_anterior = posicao is not None, tem_mais
+        else:
+            tem_proxima, tem_anterior = tem_mais, posicao is not None
+
+        self.next_position = None
+        self.previous_position = None
+        if resultados and tem_proxima:
+            self.next_position = self.get_posicao(resultados[-1])
+        if resultados and tem_anterior:
+            self.previous_position = self.get_posicao(resultados[0])
+        return resultados
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def include_count(self, request):
+        valor = request.query_params.get(self.count_query_param, '')
+        return valor.lower() in ('1', 'true')
+
+    @staticmethod
+    def inverter(campo):
+        return campo[1:] if campo.startswith('-') else '-' + campo
+
+    def filtro_keyset(self, ordering, posicao):
+        filtro = Q()
+        anteriores = {}
+        for campo, valor in zip(ordering, posicao):
+            nome = campo.lstrip('-')
+            lookup = nome + ('__lt' if campo.startswith('-') else '__gt')
+            filtro |= Q(**anteriores, **{lookup: valor})
+            anteriores[nome] = valor
+        return filtro
+
+    def get_posicao(self, instance):
+        posicao = []
+        for campo in self.ordering:
+            valor = getattr(instance, campo.lstrip('-'))
+            if isinstance(valor, datetime.datetime):
+                valor = valor.isoformat()
+            elif valor is not None and not isinstance(valor, (int, str)):
+                valor = str(valor)
+            posicao.append(valor)
+        return posicao
+
+    def decode_cursor(self, request, model):
+        """
+        Posição e direção do cursor da requisição, com cada valor convertido
+        pelo campo correspondente de `model`: um cursor adulterado (data ou
+        id em formato inválido) é recusado aqui, e não no banco.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(
+                encoded.encode('ascii')).decode('utf-8'))
+            posicao, reverso = cursor['p'], bool(cursor.get('r'))
+            if not isinstance(posicao, list) or len(posicao) != len(self.ordering):
+                raise ValueError
+            posicao = [self.converter(model, campo, valor)
+                       for campo, valor in zip(self.ordering, posicao)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return posicao, reverso
+
+    @staticmethod
+    def converter(model, campo, valor):
+        # Só os tipos que `get_posicao` gera para os campos, não nulos, de
+        # `ordering`.
+        if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+            raise ValueError
+        return model._meta.get_field(campo.lstrip('-')).to_python(valor)
+
+    def encode_cursor(self, posicao, reverso):
+        cursor = {'p': posicao}
+        if reverso:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(
+            cursor, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, True)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    description='Cursor da página, obtido em next/previous.')
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(
+                    description='Número de resultados por página.')
+            ),
+            coreapi.Field(
+                name=self.count_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Boolean(
+                    description='Inclui o total de resultados (count).')
+            ),
+        ]
@@ -0,0 +1,70 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` que codifica com o `orjson`, quando instalado. Não é o
+    padrão: as views que devolvem páginas grandes o escolhem em
+    `renderer_classes`.
+
+    Decimais, datas e demais tipos que o JSON não conhece são convertidos
+    pelo `JSONEncoder` do DRF. A saída é equivalente à do `JSONRenderer`,
+    mas não idêntica byte a byte (floats como `1e16` saem sem o `+` do
+    expoente). O que o `orjson` não codifica (chaves que não são strings,
+    inteiros maiores que 64 bits) sai pelo `JSONRenderer`, assim como os
+    pedidos com indentação (API navegável) ou sem o `orjson`.
+    """
+
+    def __init__(self):
+        self.encoder = JSONEncoder()
+
+    def converter(self, obj):
+        return self.encoder.default(obj)
+
+    def dumps(self, data):
+        if orjson is not None:
+            try:
+                conteudo = orjson.dumps(data, default=self.converter,
+                                        option=orjson.OPT_PASSTHROUGH_DATETIME)
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+            else:
+                # Como o JSONRenderer: U+2028/U+2029 escapados para uso em <script>.
+                if b'\xe2\x80' in conteudo:
+                    conteudo = conteudo.replace(b'\xe2\x80\xa8', b'\\u2028')
+                    conteudo = conteudo.replace(b'\xe2\x80\xa9', b'\\u2029')
+                return conteudo
+        return JSONRenderer().render(data)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return self.dumps(data)
+
+
+class StreamRenderer(JSONRenderer):
+    """
+    Base para formatos gerados pela própria view com `StreamingHttpResponse`.
+    Existe para a negociação de conteúdo aceitar `?format=`; só é usado de
+    fato nas respostas de erro, que saem em JSON.
+    """
+    charset = 'utf-8'
+
+
+class CSVStreamRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONStreamRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
@@ -118,6 +118,16 @@ class Schema(SwaggerAutoSchema):
         return operation
 
 
+class MultipartSchema(SwaggerAutoSchema):
+    """
+    Documenta só o multipart em actions que também aceitam JSON (upload em
+    base64), para que os `manual_parameters` `IN_FORM` sejam aceitos.
+    """
+
+    def get_consumes(self):
+        return ['multipart/form-data']
+
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Snippets API",
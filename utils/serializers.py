@@ -1,3 +1,87 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from .middleware import somar_serializacao
+
+from collections import OrderedDict
+import time
+
+
+def parametro_lista(request, nome):
+    valor = request.query_params.get(nome, '')
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+def campos_solicitados(request):
+    """
+    Campos pedidos em `?fields=` (None quando o parâmetro não foi enviado)
+    e relacionamentos pedidos em `?expand=`.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    fields = parametro_lista(request, 'fields') or None
+    return fields, parametro_lista(request, 'expand')
+
+
+def campo_solicitado(request, campo):
+    fields, expand = campos_solicitados(request)
+    return fields is None or campo in fields or campo in expand
+
+
+class CamposDinamicosMixin:
+    """
+    Seleção de campos pela query string, só no serializer raiz da resposta
+    (ou no filho de um `many=True` raiz):
+
+    - `?fields=id,valor` devolve apenas esses campos. Campos fora da lista
+      não são lidos do objeto, então propriedades como `rating` e `capa`
+      nem são calculadas;
+    - relacionamentos aninhados incluídos em `fields` saem como lista de
+      ids, a não ser que também estejam em `?expand=categorias`, quando
+      saem completos. `expand` sozinho acrescenta o relacionamento aos
+      campos pedidos.
+
+    Sem `fields`, a representação não muda. Só vale para leituras (GET).
+    """
+
+    def eh_raiz(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def to_representation(self, instance):
+        if not self.eh_raiz():
+            return super().to_representation(instance)
+        # Tempo do serializer raiz para a instrumentação (utils.middleware).
+        inicio = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            somar_serializacao(self.context.get('request'), time.perf_counter() - inicio)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.eh_raiz():
+            return fields
+        solicitados, expand = campos_solicitados(self.context.get('request'))
+        if solicitados is None:
+            return fields
+        selecionados = OrderedDict()
+        for nome, field in fields.items():
+            if nome in expand:
+                selecionados[nome] = field
+            elif nome in solicitados:
+                if isinstance(field, serializers.ListSerializer):
+                    field = serializers.PrimaryKeyRelatedField(
+                        many=True, read_only=True, source=field.source)
+                elif isinstance(field, serializers.BaseSerializer):
+                    field = serializers.PrimaryKeyRelatedField(
+                        read_only=True, source=field.source)
+                selecionados[nome] = field
+        return selecionados
+
+
 class UpdateNestedMixin:
 
     def update_nested_field(self, klass, instance, validated_data):
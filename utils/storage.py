@@ -0,0 +1,180 @@
+# Django
+from django.apps import apps
+from django.core.files import File, locks
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+
+# Utils
+from .tasks import enfileirar, tarefa
+
+# Others
+from contextlib import contextmanager
+import datetime
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def hash_conteudo(content):
+    sha = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for bloco in content.chunks(TAMANHO_BLOCO):
+        sha.update(bloco)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+@deconstructible
+class ConteudoStorage(FileSystemStorage):
+    """
+    Grava cada arquivo com o nome do sha256 do conteúdo, dentro do diretório
+    do `upload_to` (`website/images/ab/abcd...ef.jpg`). O mesmo conteúdo
+    enviado de novo reaproveita o arquivo existente, então vários registros
+    podem apontar para o mesmo arquivo: só `liberar` deve removê-lo.
+
+    Os arquivos são escritos num temporário e movidos com `os.replace`, então
+    nunca aparecem pela metade. O reaproveitamento e a remoção passam por uma
+    trava (arquivo `.trava` na raiz do storage), e `liberar` não remove
+    arquivos gravados ou reaproveitados há menos de `carencia` segundos (a
+    referência de quem acabou de reaproveitá-lo pode ainda não ter sido
+    gravada no banco): nesse caso a remoção volta para a fila de tarefas.
+    """
+    enderecado_por_conteudo = True
+    carencia = 60
+
+    @contextmanager
+    def trava(self):
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, '.trava'), 'ab') as arquivo:
+            locks.lock(arquivo, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(arquivo)
+
+    def nome_conteudo(self, name, content):
+        diretorio, arquivo = posixpath.split(name)
+        extensao = posixpath.splitext(arquivo)[1].lower()
+        digest = hash_conteudo(content)
+        return posixpath.join(diretorio, digest[:2], digest + extensao)
+
+    def reaproveitar(self, name):
+        """
+        Renova a data do arquivo, se ele existir, para `liberar` não
+        removê-lo antes de a nova referência ser gravada.
+        """
+        with self.trava():
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return False
+        return True
+
+    def get_available_name(self, name, max_length=None):
+        # O mesmo nome é o mesmo conteúdo: sobrescrever não muda nada.
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.nome_conteudo(name, content)
+        if self.reaproveitar(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def gravar(self, name, content):
+        """
+        Grava com exatamente o nome informado (derivados, cujo nome vem do
+        original), sem refazer o que já existe.
+        """
+        if self.reaproveitar(name):
+            return name
+        return super().save(name, content)
+
+    def _save(self, name, content):
+        caminho = self.path(name)
+        diretorio = os.path.dirname(caminho)
+        os.makedirs(diretorio, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for bloco in content.chunks(TAMANHO_BLOCO):
+                    destino.write(bloco if isinstance(bloco, bytes) else bloco.encode('utf-8'))
+            os.chmod(temporario, self.file_permissions_mode or 0o644)
+            with self.trava():
+                os.replace(temporario, caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return name.replace('\\', '/')
+
+    def campos(self):
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if (isinstance(field, models.FileField) and
+                        isinstance(field.storage, ConteudoStorage) and
+                        field.storage.location == self.location):
+                    yield model, field
+
+    def referenciado(self, name):
+        return any(
+            model._default_manager.filter(**{field.name: name}).exists()
+            for model, field in self.campos())
+
+    def liberar(self, name):
+        """
+        Remove o arquivo e seus derivados se nenhum registro aponta mais
+        para ele. Deve rodar depois do commit que removeu a referência.
+        """
+        from .imagens import nomes_derivados
+
+        if not name:
+            return False
+        with self.trava():
+            try:
+                idade = time.time() - os.path.getmtime(self.path(name))
+            except FileNotFoundError:
+                idade = None
+            if idade is not None and idade < self.carencia:
+                self.adiar_liberacao(name, self.carencia - idade)
+                return False
+            # Conferido dentro da trava: um `save` do mesmo conteúdo espera
+            # a remoção terminar e grava o arquivo de novo.
+            if self.referenciado(name):
+                return False
+            for nome in [name] + nomes_derivados(name):
+                self.delete(nome)
+        return True
+
+    def adiar_liberacao(self, name, segundos):
+        """
+        Agenda `liberar` para quando a carência acabar, na fila de tarefas
+        (`manage.py processar_tarefas`).
+        """
+        caminho, args, kwargs = self.deconstruct()
+        enfileirar('utils.liberar_arquivo',
+                   disponivel_em=timezone.now() + datetime.timedelta(seconds=segundos),
+                   storage=[caminho, list(args), kwargs], arquivo=name)
+
+
+@tarefa('utils.liberar_arquivo')
+def liberar_arquivo(storage, arquivo):
+    caminho, args, kwargs = storage
+    import_string(caminho)(*args, **kwargs).liberar(arquivo)
+
+
+armazenamento_conteudo = ConteudoStorage()
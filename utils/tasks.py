@@ -0,0 +1,107 @@
+# Django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+# Utils
+from .models import Tarefa
+
+# Others
+import datetime
+import json
+import logging
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_tarefas = {}
+
+
+def tarefa(nome):
+    """
+    Registra a função como handler das tarefas com o nome informado.
+    Os handlers ficam nos módulos `tasks.py` de cada app.
+    """
+    def decorator(func):
+        _tarefas[nome] = func
+        return func
+    return decorator
+
+
+def enfileirar(nome, disponivel_em=None, **payload):
+    """
+    Cria a tarefa na transação corrente: se a transação for desfeita,
+    a tarefa também é. Com `disponivel_em`, só é executada a partir dele.
+    """
+    return Tarefa.objects.create(
+        nome=nome, payload=json.dumps(payload, cls=DjangoJSONEncoder),
+        disponivel_em=disponivel_em or timezone.now())
+
+
+def backoff(tentativas, base=30, maximo=3600):
+    return min(maximo, base * 2 ** max(tentativas - 1, 0))
+
+
+def reservar_lote(limite, model=Tarefa):
+    """
+    Marca como em processamento até `limite` linhas disponíveis de `model`
+    (Tarefa ou outra fila com os mesmos campos de controle) e as retorna.
+
+    Sem `skip_locked` (SQLite), dois workers podem selecionar os mesmos ids:
+    o `update` repete a condição de disponibilidade e grava um token de
+    reserva, e só as linhas com o token deste worker são retornadas.
+    """
+    agora = timezone.now()
+    timeout = getattr(settings, 'TAREFAS_TIMEOUT', 300)
+    expiradas = agora - datetime.timedelta(seconds=timeout)
+    disponiveis = (Q(status=model.PENDENTE, disponivel_em__lte=agora) |
+                   Q(status=model.PROCESSANDO, update_at__lt=expiradas))
+    reserva = uuid.uuid4().hex
+    with transaction.atomic():
+        qs = model.objects.filter(disponiveis).order_by('disponivel_em', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('pk', flat=True)[:limite])
+        model.objects.filter(disponiveis, pk__in=ids).update(
+            status=model.PROCESSANDO, tentativas=F('tentativas') + 1,
+            update_at=agora, reserva=reserva)
+    return list(model.objects.filter(pk__in=ids, reserva=reserva))
+
+
+def executar(tarefa):
+    handler = _tarefas.get(tarefa.nome)
+    try:
+        if handler is None:
+            raise LookupError('Tarefa ' + tarefa.nome + ' não registrada')
+        with transaction.atomic():
+            handler(**json.loads(tarefa.payload))
+    except Exception:
+        logger.exception('Falha ao executar a tarefa %s', tarefa.pk)
+        tarefa.erro = traceback.format_exc()
+        if tarefa.tentativas >= tarefa.max_tentativas:
+            tarefa.status = Tarefa.FALHA
+        else:
+            tarefa.status = Tarefa.PENDENTE
+            tarefa.disponivel_em = timezone.now() + datetime.timedelta(
+                seconds=backoff(tarefa.tentativas))
+    else:
+        tarefa.status = Tarefa.CONCLUIDA
+        tarefa.erro = ''
+    tarefa.save()
+    return tarefa.status == Tarefa.CONCLUIDA
+
+
+def processar_lote(limite=None):
+    """
+    Reserva e executa um lote de tarefas. Retorna a quantidade processada.
+    """
+    autodiscover_modules('tasks')
+    limite = limite or getattr(settings, 'TAREFAS_TAMANHO_LOTE', 100)
+    tarefas = reservar_lote(limite)
+    for t in tarefas:
+        executar(t)
+    return len(tarefas)
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+
+class ArquivoMuitoGrande(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Arquivo maior que o permitido'
+    default_code = 'arquivo_muito_grande'
+
+
+def tamanho_maximo():
+    return getattr(settings, 'UPLOAD_TAMANHO_MAXIMO', 10 * 1024 * 1024)
+
+
+class TamanhoMaximoUploadHandler(FileUploadHandler):
+    """
+    Interrompe o upload assim que um arquivo passa de
+    `UPLOAD_TAMANHO_MAXIMO` bytes, sem ler o resto da requisição. Os pedaços
+    seguem para o próximo handler.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.limite = tamanho_maximo()
+        if content_length and content_length > self.limite * 2:
+            raise ArquivoMuitoGrande()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.recebido = 0
+        if self.content_length and self.content_length > self.limite:
+            raise ArquivoMuitoGrande()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recebido += len(raw_data)
+        if self.recebido > self.limite:
+            raise ArquivoMuitoGrande()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class UploadMultiPartParser(MultiPartParser):
+    """
+    `MultiPartParser` que grava os arquivos em disco (arquivo temporário),
+    em pedaços, em vez de mantê-los em memória, com o limite de tamanho de
+    `TamanhoMaximoUploadHandler`.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [
+            TamanhoMaximoUploadHandler(request),
+            TemporaryFileUploadHandler(request),
+        ]
+        return super().parse(stream, media_type, parser_context)
@@ -1,3 +1,159 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseForbidden,
+                         HttpResponseNotAllowed, StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 
-# Create your views here.
+from . import metrics
+
+import mimetypes
+import os
+import re
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+TAMANHO_BLOCO = 64 * 1024
+
+# Modos de `MEDIA_SERVIDOR`
+DJANGO = 'django'
+NGINX = 'nginx'
+SENDFILE = 'sendfile'
+
+
+def etag_arquivo(stat):
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def intervalo(header, tamanho):
+    """
+    `(inicio, fim)` (inclusivo) de um header `Range` com um único
+    intervalo; `None` quando não há header ou ele não é suportado (a
+    resposta sai inteira) e `False` quando o intervalo é inválido.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    inicio, fim = match.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        inicio, fim = max(tamanho - int(fim), 0), tamanho - 1
+    else:
+        inicio = int(inicio)
+        fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or inicio > fim:
+        return False
+    return inicio, fim
+
+
+def ler_intervalo(caminho, inicio, fim):
+    with open(caminho, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(TAMANHO_BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+
+
+def servir_media(request, path):
+    """
+    Serve os arquivos de `MEDIA_ROOT` com ETag, Last-Modified, Cache-Control
+    e requisições condicionais. Conforme `MEDIA_SERVIDOR`:
+
+    - `nginx`: só devolve os headers e um `X-Accel-Redirect` para
+      `MEDIA_ACCEL_PREFIX`, e o nginx envia o arquivo (e trata o `Range`);
+    - `sendfile`: o mesmo com `X-Sendfile` (Apache, lighttpd);
+    - `django`: envia o arquivo pelo próprio worker, com suporte a `Range`.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        caminho = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(caminho)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(caminho):
+        raise Http404
+
+    etag = etag_arquivo(stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        modo = getattr(settings, 'MEDIA_SERVIDOR', DJANGO)
+        content_type, encoding = mimetypes.guess_type(caminho)
+        content_type = content_type or 'application/octet-stream'
+        if modo == NGINX:
+            response = HttpResponse(content_type=content_type)
+            prefixo = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = prefixo + path
+        elif modo == SENDFILE:
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = caminho
+        else:
+            response = resposta_arquivo(request, caminho, stat, content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'public, max-age=%d' % getattr(
+        settings, 'MEDIA_MAX_AGE', 86400)
+    return response
+
+
+def resposta_arquivo(request, caminho, stat, content_type):
+    tamanho = stat.st_size
+    faixa = intervalo(request.META.get('HTTP_RANGE'), tamanho)
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag_arquivo(stat), http_date(stat.st_mtime)):
+        # O arquivo mudou desde a parte que o cliente já tem.
+        faixa = None
+    if faixa is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */%d' % tamanho
+        return response
+    if faixa is None:
+        # O FileResponse usa o wsgi.file_wrapper (sendfile no gunicorn).
+        response = FileResponse(open(caminho, 'rb'), content_type=content_type)
+    else:
+        inicio, fim = faixa
+        response = StreamingHttpResponse(
+            ler_intervalo(caminho, inicio, fim), status=206,
+            content_type=content_type)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (inicio, fim, tamanho)
+        response['Content-Length'] = str(fim - inicio + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def acesso_metricas(request):
+    """
+    Staff logado, IPs de `METRICAS_IPS` ou, com `METRICAS_TOKEN` definido,
+    `Authorization: Bearer <token>`.
+    """
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if token and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return True
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICAS_IPS', ()):
+        return True
+    usuario = getattr(request, 'user', None)
+    return bool(usuario is not None and usuario.is_staff)
+
+
+def metricas(request):
+    """
+    Métricas de todos os workers (ver `utils.metrics`) no formato texto do
+    Prometheus. Acesso restrito (ver `acesso_metricas`).
+    """
+    if not acesso_metricas(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.texto_prometheus(metrics.agregar()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
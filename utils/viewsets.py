@@ -1,22 +1,152 @@
+from rest_framework.response import Response
 from drf_yasg import openapi
 
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
-def list_response(viewset, model_serializer, qs, request):
-    page = viewset.paginate_queryset(qs)
+from .serializers import campo_solicitado
+
+from calendar import timegm
+from functools import wraps
+import hashlib
+
+
+def list_response(viewset, model_serializer, qs, request, pagination_class=None):
+    """
+    Serializa `qs` paginado com a paginação da viewset ou, quando informada,
+    com `pagination_class` (para escolher a paginação por endpoint/action).
+    """
+    if pagination_class is not None:
+        paginator = pagination_class()
+        page = paginator.paginate_queryset(qs, request, view=viewset)
+    else:
+        paginator = viewset
+        page = viewset.paginate_queryset(qs)
     if page is not None:
         serializer = model_serializer(
             page, many=True, context={"request": request})
-        return viewset.get_paginated_response(serializer.data)
-    serializer = model_serializer(qs, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    serializer = model_serializer(qs, many=True, context={"request": request})
     return Response(serializer.data)
 
 
-def paginated_schema(schema):
+def paginated_schema(schema, **extra_properties):
     return openapi.Schema(type=openapi.TYPE_OBJECT, properties={
         'count': openapi.Schema(type=openapi.TYPE_INTEGER),
         'next': openapi.Schema(type=openapi.TYPE_STRING),
         'previous': openapi.Schema(type=openapi.TYPE_STRING),
         'total_pages': openapi.Schema(type=openapi.TYPE_INTEGER),
-        'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=schema)
+        'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=schema),
+        **extra_properties
     }
     )
+
+
+def condicional(metodo):
+    """
+    Responde 304 antes de consultar e serializar os dados quando o
+    `If-None-Match`/`If-Modified-Since` do cliente ainda é válido.
+    Os validadores vêm de `get_validadores` (ver `CondicionalMixin`).
+    """
+    @wraps(metodo)
+    def wrapper(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validadores(request, *args, **kwargs)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = metodo(self, request, *args, **kwargs)
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+    return wrapper
+
+
+class CondicionalMixin:
+    """
+    Suporte a requisições condicionais em `list` e `retrieve`.
+
+    O ETag é calculado a partir do `max(update_at)` e da quantidade de
+    linhas do queryset filtrado (uma única consulta agregada), junto com o
+    caminho e a query string da requisição. Viewsets que sobrescrevem
+    `list`/`retrieve` devem decorá-los com `@condicional`.
+
+    `Last-Modified` só vai no `retrieve`: numa listagem, remover uma linha
+    não muda o `max(update_at)`, e o cliente que mandasse só o
+    `If-Modified-Since` receberia 304 com a lista antiga.
+    """
+
+    def get_queryset_condicional(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in kwargs:
+            queryset = queryset.filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return queryset
+
+    def get_etag_extra(self, request, *args, **kwargs):
+        return ''
+
+    def get_validadores(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset_condicional(request, *args, **kwargs)
+            agregado = queryset.order_by().aggregate(
+                ultima=Max('update_at'), total=Count('pk'))
+        except (TypeError, ValueError, ValidationError):
+            # Chave da URL em formato inválido (`/enderecos/abc/`).
+            raise Http404
+        ultima = agregado['ultima']
+        texto = '|'.join([
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            ultima.isoformat() if ultima else '',
+            str(agregado['total']),
+            str(self.get_etag_extra(request, *args, **kwargs)),
+        ])
+        etag = '"%s"' % hashlib.md5(texto.encode('utf-8')).hexdigest()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        detalhe = lookup_url_kwarg in kwargs
+        last_modified = timegm(ultima.utctimetuple()) if ultima and detalhe else None
+        return etag, last_modified
+
+    @condicional
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @condicional
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+def prefetch_campos(queryset, request, plano, serializer_class=None):
+    """
+    Aplica a `queryset` só os `prefetch_related` dos campos que serão
+    devolvidos (ver `CamposDinamicosMixin`). `plano` mapeia o nome do campo
+    no serializer para os lookups a carregar; campos que `serializer_class`
+    não declara são ignorados.
+    """
+    lookups = []
+    for campo, campo_lookups in plano.items():
+        if serializer_class is not None and campo not in serializer_class._declared_fields:
+            continue
+        if campo_solicitado(request, campo):
+            lookups.extend(campo_lookups)
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    return queryset
+
+
+class PrefetchCamposMixin:
+    """
+    `prefetch_campos` aplicado ao queryset da viewset, de acordo com o
+    serializer da action e os campos pedidos.
+    """
+    prefetch_plano = {}
+
+    def get_queryset(self):
+        return prefetch_campos(super().get_queryset(), self.request,
+                               self.prefetch_plano, self.get_serializer_class())
@@ -0,0 +1,199 @@
+# Django
+from django.conf import settings
+from django.db import transaction
+
+# Utils
+from utils.cache import versao as cache_versao, incrementar_versao
+
+# Others
+from collections import defaultdict
+import threading
+import time
+
+CHAVE_VERSAO = 'indice_categorias:versao'
+OR = 'or'
+AND = 'and'
+
+
+def popcount(bitset):
+    return bin(bitset).count('1')
+
+
+def posicoes(bitset, inicio=0, quantidade=None):
+    """
+    Posições dos bits ligados de `bitset`, do menor para o maior, pulando
+    os `inicio` primeiros.
+    """
+    dados = bitset.to_bytes((bitset.bit_length() + 7) // 8, 'little')
+    resultado = []
+    vistos = 0
+    for i, byte in enumerate(dados):
+        if not byte:
+            continue
+        n = popcount(byte)
+        if vistos + n <= inicio:
+            vistos += n
+            continue
+        for b in range(8):
+            if byte >> b & 1:
+                if vistos >= inicio:
+                    resultado.append(i * 8 + b)
+                    if quantidade is not None and len(resultado) >= quantidade:
+                        return resultado
+                vistos += 1
+    return resultado
+
+
+class Snapshot:
+    """
+    Estado imutável do índice. O bit `i` de cada bitset corresponde ao
+    produto na posição `i` da ordenação padrão (`descricao`, `id`).
+    """
+
+    def __init__(self, ids, bitsets, nomes):
+        self.ids = ids
+        self.posicao = {pk: i for i, pk in enumerate(ids)}
+        self.bitsets = bitsets
+        self.nomes = nomes
+
+    def filtrar(self, slugs, modo=OR):
+        bitsets = [self.bitsets.get(slug, 0) for slug in slugs]
+        if not bitsets:
+            return 0
+        resultado = bitsets[0]
+        for bitset in bitsets[1:]:
+            if modo == AND:
+                resultado &= bitset
+            else:
+                resultado |= bitset
+        return resultado
+
+    def bitset(self, ids):
+        """
+        Bitset dos produtos de `ids`; os que não estão no índice são ignorados.
+        """
+        dados = bytearray((len(self.ids) + 7) // 8)
+        for pk in ids:
+            p = self.posicao.get(pk)
+            if p is not None:
+                dados[p >> 3] |= 1 << (p & 7)
+        return int.from_bytes(dados, 'little')
+
+    def todos(self):
+        return (1 << len(self.ids)) - 1
+
+    def facetas(self, bitset):
+        facetas = []
+        for slug, bits in self.bitsets.items():
+            quantidade = popcount(bitset & bits)
+            if quantidade:
+                facetas.append({'slug': slug, 'nome': self.nomes[slug],
+                                'quantidade': quantidade})
+        facetas.sort(key=lambda f: (-f['quantidade'], f['nome']))
+        return facetas
+
+
+class ResultadoIndice:
+    """
+    Sequência preguiçosa dos produtos de um bitset, na ordenação padrão.
+    Pode ser passada ao paginador: o total vem do popcount e o fatiamento
+    busca no banco só os ids da página.
+    """
+
+    def __init__(self, snapshot, bitset, queryset):
+        self.snapshot = snapshot
+        self.bitset = bitset
+        self.queryset = queryset
+
+    def count(self):
+        return popcount(self.bitset)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+        inicio = k.start or 0
+        quantidade = None if k.stop is None else max(k.stop - inicio, 0)
+        if quantidade == 0:
+            return []
+        ids = [self.snapshot.ids[p]
+               for p in posicoes(self.bitset, inicio, quantidade)]
+        produtos = self.queryset.in_bulk(ids)
+        return [produtos[pk] for pk in ids if pk in produtos]
+
+    def facetas(self):
+        return self.snapshot.facetas(self.bitset)
+
+
+class IndiceCategorias:
+    """
+    Índice em memória com um bitset de produtos por slug de categoria.
+
+    Cada processo mantém sua cópia. A versão fica no cache do Django, então
+    com um cache compartilhado (`CACHE_BACKEND`) `invalidar()` em qualquer
+    processo faz todos reconstruírem o índice no próximo uso. Com o cache
+    local (LocMemCache, por processo), os outros processos só percebem a
+    mudança quando a cópia passa de `INDICE_CATEGORIAS_TTL` segundos.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.versao = None
+        self.construido_em = 0.0
+        self.lock = threading.Lock()
+
+    def desatualizado(self, versao):
+        ttl = getattr(settings, 'INDICE_CATEGORIAS_TTL', None)
+        return (self.snapshot is None or versao != self.versao or
+                (ttl is not None and time.monotonic() - self.construido_em > ttl))
+
+    def invalidar(self):
+        # Só depois do commit: antes dele, outra requisição reconstruiria o
+        # índice com os dados antigos e o guardaria com a versão nova.
+        transaction.on_commit(self._invalidar)
+
+    def _invalidar(self):
+        incrementar_versao(CHAVE_VERSAO)
+        self.versao = None
+
+    def obter(self):
+        versao = cache_versao(CHAVE_VERSAO)
+        if self.desatualizado(versao):
+            with self.lock:
+                if self.desatualizado(versao):
+                    self.snapshot = self.construir()
+                    self.versao = versao
+                    self.construido_em = time.monotonic()
+        return self.snapshot
+
+    def construir(self):
+        from .models import Categoria, Produto
+
+        ids = list(Produto.objects.order_by(
+            'descricao', 'id').values_list('pk', flat=True))
+        posicao = {pk: i for i, pk in enumerate(ids)}
+        tamanho = (len(ids) + 7) // 8
+        bytes_por_slug = defaultdict(lambda: bytearray(tamanho))
+        through = Produto.categorias.through
+        for slug, produto_id in through.objects.values_list(
+                'categoria__slug', 'produto_id').iterator():
+            p = posicao.get(produto_id)
+            if p is not None:
+                bytes_por_slug[slug][p >> 3] |= 1 << (p & 7)
+        bitsets = {slug: int.from_bytes(dados, 'little')
+                   for slug, dados in bytes_por_slug.items()}
+        nomes = dict(Categoria.objects.values_list('slug', 'nome'))
+        return Snapshot(ids, bitsets, nomes)
+
+    def filtrar(self, slugs, queryset, modo=OR):
+        snapshot = self.obter()
+        return ResultadoIndice(snapshot, snapshot.filtrar(slugs, modo), queryset)
+
+    def facetas(self):
+        snapshot = self.obter()
+        return snapshot.facetas(snapshot.todos())
+
+
+indice_categorias = IndiceCategorias()
@@ -0,0 +1,65 @@
+# Django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# Utils
+from utils.cache import versao, incrementar_versao
+from utils.metrics import incrementar
+from utils.imagens import formato_pedido
+
+# Others
+import hashlib
+
+
+CHAVE_VERSAO_PRODUTOS = 'produtos:versao'
+CHAVE_VERSAO_OFERTAS = 'ofertas:versao'
+
+
+def chave_versao_produto(pk):
+    return 'produto:%s:versao' % pk
+
+
+def versao_produto(pk):
+    return versao(chave_versao_produto(pk))
+
+
+def versao_produtos():
+    """
+    Versão geral, incrementada junto com a de qualquer produto.
+    """
+    return versao(CHAVE_VERSAO_PRODUTOS)
+
+
+def invalidar_produtos(*pks):
+    """
+    Incrementa as versões depois do commit da transação corrente: antes
+    dele, outra requisição ainda lê os dados antigos e os guardaria com a
+    versão nova.
+    """
+    chaves = [CHAVE_VERSAO_PRODUTOS] + [chave_versao_produto(pk) for pk in pks]
+    transaction.on_commit(lambda: incrementar_versao(*chaves))
+
+
+def invalidar_ofertas():
+    transaction.on_commit(lambda: incrementar_versao(CHAVE_VERSAO_OFERTAS))
+
+
+def produto_serializado(pk, serializar, request):
+    """
+    Representação de um produto lida do cache, ou gerada por `serializar()`
+    e guardada. A chave inclui a versão do produto, incrementada pelos
+    signals sempre que ele ou seus relacionamentos mudam, o host da
+    requisição, já que as URLs das imagens são absolutas, e o formato das
+    imagens pedido.
+    """
+    host = hashlib.md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()
+    chave = 'produto:%s:v%s:%s:%s' % (pk, versao_produto(pk), host, formato_pedido(request))
+    data = cache.get(chave)
+    incrementar('cache_consultas_total', cache='produtos',
+                resultado='miss' if data is None else 'hit')
+    if data is None:
+        data = serializar()
+        cache.set(chave, data, getattr(
+            settings, 'PRODUTOS_CACHE_TIMEOUT', 600))
+    return data
@@ -0,0 +1,65 @@
+# Django
+from django.conf import settings
+
+# Utils
+from utils.renderers import FastJSONRenderer
+
+# Others
+import csv
+
+COLUNAS = (
+    ('venda', 'venda_id'),
+    ('data', 'venda__created_at'),
+    ('cliente', 'venda__cliente_id'),
+    ('status', 'venda__status'),
+    ('valor_total', 'venda__valor_total'),
+    ('endereco_entrega', 'venda__endereco_entrega_id'),
+    ('item', 'id'),
+    ('produto', 'produto_id'),
+    ('valor', 'valor'),
+    ('quantidade', 'quantidade'),
+)
+
+
+def itens_vendas(vendas):
+    """
+    Itens das `vendas` já com os dados da venda, em uma única consulta lida
+    do banco em blocos (cursor do lado do servidor no Postgres).
+    """
+    from .models import ItemVenda
+
+    chunk_size = getattr(settings, 'EXPORTACAO_CHUNK_SIZE', 2000)
+    return ItemVenda.objects.filter(venda__in=vendas).order_by(
+        'venda__created_at', 'venda_id', 'id').values_list(
+        *[campo for _, campo in COLUNAS]).iterator(chunk_size=chunk_size)
+
+
+class Eco:
+    """
+    Objeto com `write` que só devolve o valor, para o `csv.writer` gerar
+    uma linha de cada vez.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas):
+    writer = csv.writer(Eco())
+    yield writer.writerow([nome for nome, _ in COLUNAS])
+    for linha in linhas:
+        yield writer.writerow(
+            [v.isoformat() if hasattr(v, 'isoformat') else v for v in linha])
+
+
+def gerar_ndjson(linhas):
+    renderer = FastJSONRenderer()
+    nomes = [nome for nome, _ in COLUNAS]
+    for linha in linhas:
+        yield renderer.dumps(dict(zip(nomes, linha))) + b'\n'
+
+
+FORMATOS = {
+    'csv': (gerar_csv, 'text/csv; charset=utf-8'),
+    'ndjson': (gerar_ndjson, 'application/x-ndjson'),
+}
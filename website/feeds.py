@@ -0,0 +1,66 @@
+# Rest Framework
+from rest_framework.renderers import JSONRenderer
+
+# Django
+from django.core.cache import cache
+from django.utils import timezone
+
+# Website
+from .cache import CHAVE_VERSAO_OFERTAS
+
+# Utils
+from utils.cache import versao
+from utils.metrics import incrementar
+from utils.imagens import formato_pedido
+
+# Others
+import hashlib
+import time
+
+# Sem nenhuma oferta para vencer, o feed ainda é refeito de tempos em tempos.
+TIMEOUT_MAXIMO = 3600
+# Segundos que navegadores e CDNs podem usar o feed sem revalidar.
+MAX_AGE_BANNERS = 60
+
+
+def gerar_feed_banners(request):
+    """
+    Serializa de uma vez as ofertas de banner válidas. O feed expira junto
+    com a primeira delas a vencer.
+    """
+    from .models import Oferta
+    from .serializers import OfertaSerializer
+
+    agora = timezone.now()
+    ofertas = list(Oferta.objects.filter(
+        is_banner=True, validade__gte=agora).order_by('validade', 'id'))
+    data = OfertaSerializer(
+        ofertas, many=True, context={'request': request}).data
+    conteudo = JSONRenderer().render(data)
+    timeout = TIMEOUT_MAXIMO
+    if ofertas:
+        timeout = min(timeout, (ofertas[0].validade - agora).total_seconds())
+    return {
+        'conteudo': conteudo,
+        'etag': '"%s"' % hashlib.md5(conteudo).hexdigest(),
+        'expira': time.time() + timeout,
+    }
+
+
+def feed_banners(request):
+    """
+    Feed de banners guardado no cache. A chave inclui a versão das ofertas,
+    incrementada pelos signals de `Oferta`, o host da requisição, já que
+    as URLs das fotos são absolutas, e o formato das imagens pedido.
+    """
+    host = hashlib.md5(request.build_absolute_uri('/').encode('utf-8')).hexdigest()
+    chave = 'feed_banners:v%s:%s:%s' % (
+        versao(CHAVE_VERSAO_OFERTAS), host, formato_pedido(request))
+    feed = cache.get(chave)
+    expirado = feed is None or feed['expira'] <= time.time()
+    incrementar('cache_consultas_total', cache='banners',
+                resultado='miss' if expirado else 'hit')
+    if expirado:
+        feed = gerar_feed_banners(request)
+        cache.set(chave, feed, max(int(feed['expira'] - time.time()), 1))
+    return feed
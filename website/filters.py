@@ -1,5 +1,6 @@
 import django_filters
 from .models import Produto, Categoria, Venda
+from .bitmaps import indice_categorias, posicoes
 
 
 class ProdutoFilter(django_filters.FilterSet):
@@ -11,9 +12,10 @@ class ProdutoFilter(django_filters.FilterSet):
 
     def tag_filter(self, queryset, name, value):
         slugs = value.split(',')
-        categorias = Categoria.objects.filter(slug__in=slugs)
-        queryset = queryset.filter(categorias__in=categorias)
-        return queryset
+        snapshot = indice_categorias.obter()
+        bitset = snapshot.filtrar(slugs)
+        ids = [snapshot.ids[p] for p in posicoes(bitset)]
+        return queryset.filter(pk__in=ids)
 
 
 class VendaFilter(django_filters.FilterSet):
@@ -0,0 +1,110 @@
+# Rest Framework
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Django
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+# Website
+from .models import ChaveIdempotencia
+
+# Others
+from functools import wraps
+import datetime
+import hashlib
+import json
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def digest(data):
+    conteudo = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def resposta_armazenada(registro):
+    response = Response(json.loads(registro.resposta),
+                        status=registro.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def retomar_reserva(registro):
+    """
+    Assume uma reserva abandonada. O `update` condicional garante que só uma
+    das repetições concorrentes a retoma.
+    """
+    ttl = getattr(settings, 'IDEMPOTENCIA_TTL_RESERVA', 60)
+    agora = timezone.now()
+    if registro.update_at > agora - datetime.timedelta(seconds=ttl):
+        return False
+    retomada = ChaveIdempotencia.objects.filter(
+        pk=registro.pk, status_code__isnull=True,
+        update_at=registro.update_at).update(update_at=agora)
+    registro.update_at = agora
+    return bool(retomada)
+
+
+def idempotente(endpoint):
+    """
+    Torna a action idempotente através do header `Idempotency-Key`.
+
+    A primeira requisição com uma chave reserva a chave (índice único por
+    usuário, endpoint e chave, gravado na sua própria transação), executa a
+    action e guarda a resposta na transação dela. Repetições com a mesma
+    chave recebem a resposta armazenada; enquanto a primeira está em
+    andamento, recebem 409. Uma reserva sem resposta há mais de
+    `IDEMPOTENCIA_TTL_RESERVA` segundos (o worker morreu ou estourou o
+    tempo) pode ser retomada por uma repetição.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            chave = request.META.get(HEADER)
+            if not chave or not request.user.is_authenticated:
+                return func(self, request, *args, **kwargs)
+
+            digest_requisicao = digest(request.data)
+            try:
+                with transaction.atomic():
+                    registro = ChaveIdempotencia.objects.create(
+                        user=request.user, endpoint=endpoint, chave=chave,
+                        digest_requisicao=digest_requisicao)
+            except IntegrityError:
+                registro = ChaveIdempotencia.objects.get(
+                    user=request.user, endpoint=endpoint, chave=chave)
+                if registro.digest_requisicao != digest_requisicao:
+                    data = {
+                        'detail': 'A chave de idempotência já foi usada com outra requisição'}
+                    return Response(data, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if registro.status_code is not None:
+                    return resposta_armazenada(registro)
+                if not retomar_reserva(registro):
+                    data = {
+                        'detail': 'Uma requisição com essa chave de idempotência está em processamento'}
+                    return Response(data, status=status.HTTP_409_CONFLICT)
+
+            try:
+                with transaction.atomic():
+                    response = func(self, request, *args, **kwargs)
+                    if status.is_success(response.status_code):
+                        resposta = json.dumps(response.data, cls=JSONEncoder)
+                        registro.status_code = response.status_code
+                        registro.resposta = resposta
+                        registro.digest_resposta = hashlib.sha256(
+                            resposta.encode('utf-8')).hexdigest()
+                        if isinstance(response.data, dict):
+                            registro.venda_id = response.data.get('id')
+                        registro.save()
+            except Exception:
+                registro.delete()
+                raise
+            if not status.is_success(response.status_code):
+                # A chave é liberada para que o cliente possa tentar novamente.
+                registro.delete()
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,209 @@
+# Django
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connections, router, transaction
+
+# Website
+from .bitmaps import indice_categorias
+from .cache import invalidar_produtos
+from . import search
+
+# Others
+from decimal import Decimal
+from functools import wraps
+from itertools import islice
+from slugify import slugify
+import csv
+import json
+
+CAMPOS = ('descricao', 'descricao_completa', 'valor', 'qtd_estoque', 'qtd_limite')
+SEPARADOR_CATEGORIAS = '|'
+MAX_ERROS = 1000
+
+
+def linhas_texto(arquivo):
+    """
+    Linhas de `arquivo` como texto, lidas sob demanda. Aceita arquivos
+    abertos em modo texto e uploads (que iteram em bytes).
+    """
+    for linha in arquivo:
+        if isinstance(linha, bytes):
+            linha = linha.decode('utf-8')
+        yield linha.lstrip('\ufeff')
+
+
+def interromper_em_erro(leitor):
+    """
+    Se o arquivo não puder mais ser lido (não está em UTF-8 ou o CSV está
+    malformado), a linha em que a leitura parou vira um erro na importação e
+    as seguintes são descartadas.
+    """
+    @wraps(leitor)
+    def wrapper(arquivo):
+        registros = leitor(arquivo)
+        while True:
+            try:
+                dados = next(registros)
+            except StopIteration:
+                return
+            except UnicodeDecodeError:
+                yield ValidationError('O arquivo deve estar em UTF-8')
+                return
+            except csv.Error as e:
+                yield ValidationError('CSV inválido: %s' % e)
+                return
+            yield dados
+    return wrapper
+
+
+@interromper_em_erro
+def ler_csv(arquivo):
+    """
+    CSV com cabeçalho. As categorias vêm em uma única coluna, separadas
+    por `|`.
+    """
+    for dados in csv.DictReader(linhas_texto(arquivo)):
+        categorias = dados.get('categorias') or ''
+        dados['categorias'] = [c for c in categorias.split(SEPARADOR_CATEGORIAS) if c.strip()]
+        yield dados
+
+
+@interromper_em_erro
+def ler_ndjson(arquivo):
+    """
+    Um objeto JSON por linha, com `categorias` como lista de nomes. Linhas
+    inválidas viram erro na importação.
+    """
+    for linha in linhas_texto(arquivo):
+        if not linha.strip():
+            continue
+        try:
+            dados = json.loads(linha, parse_float=Decimal)
+            if not isinstance(dados, dict):
+                raise ValueError
+        except ValueError:
+            dados = ValidationError('JSON inválido')
+        yield dados
+
+
+LEITORES = {
+    'csv': ler_csv,
+    'ndjson': ler_ndjson,
+}
+
+
+class ResultadoImportacao:
+
+    def __init__(self):
+        self.criados = 0
+        self.total_erros = 0
+        self.erros = []
+
+    def erro(self, linha, erro):
+        self.total_erros += 1
+        if len(self.erros) < MAX_ERROS:
+            if hasattr(erro, 'message_dict'):
+                mensagens = erro.message_dict
+            elif hasattr(erro, 'messages'):
+                mensagens = erro.messages
+            else:
+                mensagens = [str(erro)]
+            self.erros.append({'linha': linha, 'erros': mensagens})
+
+    def to_dict(self):
+        return {'criados': self.criados, 'total_erros': self.total_erros,
+                'erros': self.erros}
+
+
+def validar_linha(dados):
+    from .models import Produto
+
+    if isinstance(dados, ValidationError):
+        raise dados
+    valores = {campo: dados[campo] for campo in CAMPOS
+               if dados.get(campo) not in (None, '')}
+    produto = Produto(**valores)
+    # Só os campos: `full_clean` também consultaria o banco.
+    produto.clean_fields(exclude=['id', 'created_at', 'update_at'])
+    categorias = dados.get('categorias') or []
+    if not isinstance(categorias, list):
+        raise ValidationError({'categorias': ['Deve ser uma lista de nomes']})
+    nomes = [str(nome).strip() for nome in categorias]
+    return produto, [nome for nome in nomes if nome]
+
+
+def salvar_lote(validos):
+    """
+    Grava um lote de `(linha, produto, nomes das categorias)` em uma
+    transação: categorias em lote, produtos com `bulk_create` e as ligações
+    produto-categoria com um único `bulk_create` na tabela intermediária.
+    """
+    from .models import Categoria, Produto
+
+    through = Produto.categorias.through
+    connection = connections[router.db_for_write(Produto)]
+    with transaction.atomic():
+        categorias = Categoria.resolver(
+            [nome for _, _, nomes in validos for nome in nomes])
+        produtos = [produto for _, produto, _ in validos]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Produto.objects.bulk_create(produtos)
+            for produto in produtos:
+                search.indexar_produto(produto)
+        else:
+            # Sem os ids de volta do bulk_create (SQLite), salva um a um.
+            for produto in produtos:
+                produto.save()
+        ligacoes = {}
+        for _, produto, nomes in validos:
+            for nome in nomes:
+                categoria = categorias.get(slugify(nome))
+                if categoria is not None:
+                    ligacoes[produto.pk, categoria.pk] = through(
+                        produto_id=produto.pk, categoria_id=categoria.pk)
+        through.objects.bulk_create(ligacoes.values(), ignore_conflicts=True)
+
+
+def importar_produtos(registros, lote=None):
+    """
+    Importa produtos de `registros` (ver `LEITORES`) em lotes de `lote`
+    linhas. Linhas inválidas são reportadas no resultado sem interromper o
+    lote; se a gravação do lote falhar, as linhas dele são gravadas uma a
+    uma para isolar as que têm problema.
+    """
+    lote = lote or getattr(settings, 'IMPORTACAO_TAMANHO_LOTE', 1000)
+    resultado = ResultadoImportacao()
+    numerados = enumerate(registros, 1)
+    try:
+        while True:
+            linhas = list(islice(numerados, lote))
+            if not linhas:
+                break
+            validos = []
+            for numero, dados in linhas:
+                try:
+                    produto, nomes = validar_linha(dados)
+                except ValidationError as e:
+                    resultado.erro(numero, e)
+                    continue
+                validos.append((numero, produto, nomes))
+            if not validos:
+                continue
+            try:
+                salvar_lote(validos)
+                resultado.criados += len(validos)
+            except DatabaseError:
+                for numero, produto, nomes in validos:
+                    produto.pk = None
+                    produto._state.adding = True
+                    try:
+                        salvar_lote([(numero, produto, nomes)])
+                        resultado.criados += 1
+                    except DatabaseError as e:
+                        resultado.erro(numero, e)
+    finally:
+        # bulk_create não dispara os signals dos produtos e categorias.
+        if resultado.criados:
+            indice_categorias.invalidar()
+            invalidar_produtos()
+    return resultado
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from utils import renderers
+from utils.renderers import FastJSONRenderer
+from website.models import Produto, Venda
+from website.serializers import ProdutoListSerializer, VendaSerializer
+
+import timeit
+
+
+class Command(BaseCommand):
+    help = ('Compara o tempo de renderização do JSONRenderer e do '
+            'FastJSONRenderer em páginas grandes de produtos e vendas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho', type=int, default=1000,
+                            help='Itens por página')
+        parser.add_argument('--repeticoes', type=int, default=20)
+
+    def pagina(self, serializer_class, queryset, tamanho):
+        request = Request(APIRequestFactory().get('/'))
+        dados = list(serializer_class(
+            queryset[:tamanho], many=True, context={'request': request}).data)
+        if not dados:
+            return None
+        # Com poucas linhas no banco, repete as existentes até o tamanho pedido.
+        dados = (dados * (tamanho // len(dados) + 1))[:tamanho]
+        return {'next': None, 'previous': None, 'count': tamanho,
+                'total_pages': 1, 'results': dados}
+
+    def handle(self, *args, **options):
+        tamanho, repeticoes = options['tamanho'], options['repeticoes']
+        paginas = [
+            ('ProdutoListSerializer', self.pagina(
+                ProdutoListSerializer, Produto.objects.order_by('id'), tamanho)),
+            ('VendaSerializer', self.pagina(
+                VendaSerializer, Venda.objects.prefetch_related('itens').order_by('id'), tamanho)),
+        ]
+        backend = 'orjson' if renderers.orjson is not None else 'json'
+        self.stdout.write('FastJSONRenderer usando %s, %d itens por página, %d repetições'
+                          % (backend, tamanho, repeticoes))
+        for nome, pagina in paginas:
+            if pagina is None:
+                self.stdout.write('%s: nenhum registro no banco' % nome)
+                continue
+            padrao, rapido = JSONRenderer(), FastJSONRenderer()
+            if padrao.render(pagina) != rapido.render(pagina):
+                self.stdout.write(self.style.WARNING(
+                    '%s: as saídas dos renderizadores diferem' % nome))
+            t_padrao = timeit.timeit(lambda: padrao.render(pagina), number=repeticoes)
+            t_rapido = timeit.timeit(lambda: rapido.render(pagina), number=repeticoes)
+            self.stdout.write('%s: JSONRenderer %.2f ms, FastJSONRenderer %.2f ms (%.1fx)' % (
+                nome, t_padrao * 1000 / repeticoes, t_rapido * 1000 / repeticoes,
+                t_padrao / t_rapido))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from website.models import ImagemProduto, Oferta
+from utils.tasks import enfileirar
+
+
+class Command(BaseCommand):
+    help = 'Agenda a geração das versões redimensionadas das imagens que ainda não as têm'
+
+    def handle(self, *args, **options):
+        n = 0
+        for model in (ImagemProduto, Oferta):
+            vazio = {model.CAMPO_IMAGEM: ''}
+            qs = model.objects.filter(derivados_gerados=False).exclude(
+                **vazio).exclude(**{model.CAMPO_IMAGEM + '__isnull': True})
+            for pk in qs.values_list('pk', flat=True).iterator():
+                enfileirar('website.gerar_derivados',
+                           modelo=model._meta.label, pk=pk)
+                n += 1
+        self.stdout.write('%d imagem(ns) agendada(s)' % n)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from website.importacao import LEITORES, importar_produtos
+
+import os
+
+
+class Command(BaseCommand):
+    help = 'Importa produtos de um arquivo CSV ou NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo')
+        parser.add_argument('--formato', choices=sorted(LEITORES),
+                            help='Padrão: extensão do arquivo')
+        parser.add_argument('--lote', type=int, default=None)
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or os.path.splitext(
+            options['arquivo'])[1].lstrip('.').lower()
+        if formato not in LEITORES:
+            raise CommandError('Formato desconhecido: %s' % formato)
+        with open(options['arquivo'], encoding='utf-8', newline='') as arquivo:
+            resultado = importar_produtos(
+                LEITORES[formato](arquivo), lote=options['lote'])
+        for erro in resultado.erros:
+            self.stderr.write('Linha %(linha)d: %(erros)s' % erro)
+        self.stdout.write('%d produto(s) importado(s), %d erro(s)' % (
+            resultado.criados, resultado.total_erros))
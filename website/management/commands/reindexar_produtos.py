@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from website.models import Produto
+from website.search import get_backend_produto
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca dos produtos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        backend = get_backend_produto()
+        if backend is None:
+            self.stdout.write('Banco de dados sem suporte ao índice de busca')
+            return
+        with transaction.atomic():
+            backend.remover_tabela()
+            backend.criar()
+            qs = Produto.objects.order_by().values_list(
+                'pk', 'descricao', 'descricao_completa')
+            n = 0
+            for pk, descricao, descricao_completa in qs.iterator(chunk_size=options['lote']):
+                backend.indexar(pk, descricao, descricao_completa)
+                n += 1
+        self.stdout.write('%d produto(s) indexado(s)' % n)
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0003_remove_produto_logo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+                ('update_at', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('endpoint', models.CharField(max_length=100, verbose_name='Endpoint')),
+                ('chave', models.CharField(max_length=255, verbose_name='Chave')),
+                ('digest_requisicao', models.CharField(max_length=64, verbose_name='Digest da requisição')),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True, verbose_name='Status da resposta')),
+                ('resposta', models.TextField(blank=True, default='', verbose_name='Resposta')),
+                ('digest_resposta', models.CharField(blank=True, default='', max_length=64, verbose_name='Digest da resposta')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chaves_idempotencia', to=settings.AUTH_USER_MODEL)),
+                ('venda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chaves_idempotencia', to='website.Venda')),
+            ],
+            options={
+                'verbose_name': 'Chave de idempotência',
+                'verbose_name_plural': 'Chaves de idempotência',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chaveidempotencia',
+            constraint=models.UniqueConstraint(fields=('user', 'endpoint', 'chave'), name='unique_chave_idempotencia'),
+        ),
+    ]
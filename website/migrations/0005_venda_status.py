@@ -0,0 +1,25 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+def confirmar_vendas_existentes(apps, schema_editor):
+    Venda = apps.get_model('website', 'Venda')
+    Venda.objects.update(status='CONFIRMADA')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_auto_20261019_1704'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='status',
+            field=models.CharField(choices=[('CONFIRMADA', 'Confirmada'), ('CANCELADA', 'Cancelada'), ('PENDENTE', 'Pendente')], default='PENDENTE', max_length=10, verbose_name='Status'),
+        ),
+        migrations.RunPython(confirmar_vendas_existentes,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from website.search import get_backend
+
+
+def criar_indice(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is None:
+        return
+    backend.criar()
+    Produto = apps.get_model('website', 'Produto')
+    qs = Produto.objects.using(schema_editor.connection.alias).order_by(
+    ).values_list('pk', 'descricao', 'descricao_completa')
+    for pk, descricao, descricao_completa in qs.iterator():
+        backend.indexar(pk, descricao, descricao_completa)
+
+
+def remover_indice(apps, schema_editor):
+    backend = get_backend(schema_editor.connection)
+    if backend is not None:
+        backend.remover_tabela()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_venda_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0006_produto_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemproduto',
+            name='derivados_gerados',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Derivados gerados'),
+        ),
+        migrations.AddField(
+            model_name='oferta',
+            name='derivados_gerados',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Derivados gerados'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.0.2 on 2026-10-19 17:28
+
+from django.db import migrations, models
+import utils.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0007_imagens_derivados'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagemproduto',
+            name='imagem',
+            field=models.ImageField(blank=True, null=True, storage=utils.storage.ConteudoStorage(), upload_to='website/images', verbose_name='Imagem'),
+        ),
+        migrations.AlterField(
+            model_name='oferta',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=utils.storage.ConteudoStorage(), upload_to='website/images/ofertas', verbose_name='Foto'),
+        ),
+    ]
@@ -6,7 +6,8 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 
-from utils.models import ModelLog
+from utils.models import ModelLog, ModelImagem
+from utils.storage import armazenamento_conteudo
 
 from rest_framework import serializers
 from decimal import Decimal
@@ -75,6 +76,27 @@ class Categoria(ModelLog):
     class Meta:
         ordering = ['nome']
 
+    @classmethod
+    def resolver(cls, nomes):
+        """
+        Categorias de `nomes` indexadas pelo slug, criando as que faltam:
+        uma consulta para as existentes e um `bulk_create` para as novas.
+        """
+        por_slug = {}
+        for nome in nomes:
+            nome = str(nome).strip()
+            por_slug.setdefault(slugify(nome), nome)
+        por_slug.pop('', None)
+        categorias = cls.objects.in_bulk(list(por_slug), field_name='slug')
+        novas = [cls(nome=nome, slug=slug)
+                 for slug, nome in por_slug.items() if slug not in categorias]
+        if novas:
+            # Outra requisição pode criar o mesmo slug ao mesmo tempo.
+            cls.objects.bulk_create(novas, ignore_conflicts=True)
+            categorias.update(cls.objects.in_bulk(
+                [c.slug for c in novas], field_name='slug'))
+        return categorias
+
     @property
     def receita(self):
         expression = models.ExpressionWrapper(
@@ -104,6 +126,25 @@ class Produto(ModelLog):
     avaliacoes = models.ManyToManyField(
         'accounts.Cliente', through='AvaliacaoProduto')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._descricao_carregada = instance.__dict__.get('descricao')
+        instance._descricao_completa_carregada = instance.__dict__.get('descricao_completa')
+        return instance
+
+    @property
+    def descricao_alterada(self):
+        return self.descricao != getattr(self, '_descricao_carregada', None)
+
+    @property
+    def texto_alterado(self):
+        """
+        Se mudou algum dos campos indexados pela busca (`website.search`).
+        """
+        return self.descricao_alterada or (
+            self.descricao_completa != getattr(self, '_descricao_completa_carregada', None))
+
     @property
     def capa(self):
         capa = self.imagens.filter(capa=True).first()
@@ -120,10 +161,30 @@ class Produto(ModelLog):
         return self.descricao
 
     def add_categoria(self, categoria):
-        c, created = Categoria.objects.get_or_create(
-            nome=categoria, slug=slugify(categoria))
-        self.categorias.add(c)
-        self.save()
+        self.add_categorias([categoria])
+
+    def add_categorias(self, nomes):
+        return Produto.adicionar_categorias([self.pk], nomes)
+
+    @classmethod
+    def adicionar_categorias(cls, pks, nomes):
+        """
+        Adiciona as categorias `nomes` (criando as que faltam) a todos os
+        produtos `pks`, com um único insert na tabela intermediária.
+        """
+        from .bitmaps import indice_categorias
+        from .cache import invalidar_produtos
+
+        categorias = Categoria.resolver(nomes)
+        through = cls.categorias.through
+        through.objects.bulk_create([
+            through(produto_id=pk, categoria_id=categoria.pk)
+            for pk in set(pks) for categoria in categorias.values()
+        ], ignore_conflicts=True)
+        # bulk_create não dispara o m2m_changed.
+        indice_categorias.invalidar()
+        invalidar_produtos(*pks)
+        return list(categorias.values())
 
     def validar_qtd(self, quantidade, error, messages):
         if self.qtd_estoque == 0:
@@ -274,10 +335,13 @@ class ItemCarrinho(ModelLog):
 
 
 class Venda(ModelLog):
+    CONFIRMADA = 'CONFIRMADA'
+    CANCELADA = 'CANCELADA'
+    PENDENTE = 'PENDENTE'
     STATUS = (
-        'CONFIRMADA',
-        'CANCELADA',
-        'PENDENTE'
+        (CONFIRMADA, 'Confirmada'),
+        (CANCELADA, 'Cancelada'),
+        (PENDENTE, 'Pendente')
     )
     produtos = models.ManyToManyField(
         'website.Produto', through='ItemVenda', related_name='vendas')
@@ -287,7 +351,8 @@ class Venda(ModelLog):
         'Valor', max_digits=10, decimal_places=2, blank=True, default=Decimal('0.00'))
     endereco_entrega = models.ForeignKey(
         'website.Endereco', on_delete=models.CASCADE, related_name='vendas', null=True, blank=True)
-    #status = models.CharField('')
+    status = models.CharField(
+        'Status', max_length=10, choices=STATUS, default=PENDENTE)
 
     def atualizar_valor(self):
         expression = Sum(F('valor') * F('quantidade'),
@@ -342,14 +407,15 @@ class AvaliacaoProduto(ModelLog):
         verbose_name_plural = 'Avaliações dos Produtos'
 
 
-class Oferta(ModelLog):
+class Oferta(ModelImagem, ModelLog):
+    CAMPO_IMAGEM = 'foto'
 
     owner = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='ofertas')
     descricao = models.TextField('Descrição', null=True, blank=True)
     foto = models.ImageField(
         upload_to='website/images/ofertas', verbose_name='Foto',
-        null=True, blank=True)
+        storage=armazenamento_conteudo, null=True, blank=True)
     valor = models.DecimalField('Valor', max_digits=10, decimal_places=2)
     produto = models.ForeignKey(
         'website.Produto', on_delete=models.CASCADE, related_name='ofertas')
@@ -363,12 +429,13 @@ class Oferta(ModelLog):
         ordering = ['-validade']
 
 
-class ImagemProduto(ModelLog):
+class ImagemProduto(ModelImagem, ModelLog):
+    CAMPO_IMAGEM = 'imagem'
     produto = models.ForeignKey(
         'website.Produto', on_delete=models.CASCADE, related_name='imagens')
     imagem = models.ImageField(
         upload_to='website/images', verbose_name='Imagem',
-        null=True, blank=True)
+        storage=armazenamento_conteudo, null=True, blank=True)
     capa = models.BooleanField('É capa?', default=False, blank=True)
 
     def __str__(self):
@@ -377,3 +444,30 @@ class ImagemProduto(ModelLog):
     class Meta:
         verbose_name = 'Imagem do Produtos'
         verbose_name_plural = 'Imagens dos Produtos'
+
+
+class ChaveIdempotencia(ModelLog):
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='chaves_idempotencia')
+    endpoint = models.CharField('Endpoint', max_length=100)
+    chave = models.CharField('Chave', max_length=255)
+    digest_requisicao = models.CharField('Digest da requisição', max_length=64)
+    venda = models.ForeignKey(
+        'website.Venda', on_delete=models.SET_NULL, related_name='chaves_idempotencia',
+        null=True, blank=True)
+    status_code = models.PositiveIntegerField(
+        'Status da resposta', null=True, blank=True)
+    resposta = models.TextField('Resposta', blank=True, default='')
+    digest_resposta = models.CharField(
+        'Digest da resposta', max_length=64, blank=True, default='')
+
+    def __str__(self):
+        return str(self.user) + ' - ' + self.endpoint + ' - ' + self.chave
+
+    class Meta:
+        verbose_name = 'Chave de idempotência'
+        verbose_name_plural = 'Chaves de idempotência'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'endpoint', 'chave'], name='unique_chave_idempotencia')
+        ]
@@ -0,0 +1,13 @@
+from utils.pagination import KeysetPagination
+
+
+class VendaPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class AvaliacaoProdutoPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class ProdutoPagination(KeysetPagination):
+    ordering = ('descricao', 'id')
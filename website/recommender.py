@@ -1,7 +1,9 @@
 import pandas as pd
 from website.models import AvaliacaoProduto, Produto
 from accounts.models import Cliente
+from utils import metrics
 import numpy as np
+import time
 
 
 class Recommender:
@@ -33,11 +35,18 @@ class Recommender:
                           j] /= np.sum(np.abs(similarity[i, :][tuple(top_k_users)]))
 
     def fit(self):
+        inicio = time.perf_counter()
         df_ratings = self.load_rating()
         ratings = self.create_ratings_u_i(df_ratings)
         similarity = self.compute_similarity(ratings)
         self.compute_pred(ratings, similarity)
         self.is_fitted = True
+        nome = type(self).__name__
+        metrics.observar('recomendador_treino_segundos',
+                         time.perf_counter() - inicio,
+                         buckets=(.1, .5, 1, 5, 10, 30, 60, 300), modelo=nome)
+        # A idade do modelo é calculada no /metrics a partir deste horário.
+        metrics.definir('recomendador_treinado_em_segundos', time.time(), modelo=nome)
 
     def get_topk(self, userId, k=5):
         return np.argsort(self.pred[userId-1, :])[:-k-1:-1] + 1
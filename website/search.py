@@ -0,0 +1,271 @@
+# Rest Framework
+from rest_framework.filters import BaseFilterBackend
+
+# Django
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, router
+from django.db.models import Count, Q
+
+# Others
+from slugify import slugify
+import coreapi
+import coreschema
+
+TABELA = 'website_produto_busca'
+
+
+def normalizar(texto):
+    """
+    Remove acentos e caixa da mesma forma que o `slugify` usado nas
+    categorias, para que 'Ação' e 'acao' encontrem os mesmos produtos.
+    """
+    return slugify(texto or '', separator=' ')
+
+
+def termos(texto):
+    return normalizar(texto).split()
+
+
+def limite():
+    """
+    Máximo de ids devolvidos por uma busca: só os mais relevantes são
+    paginados e contados.
+    """
+    return getattr(settings, 'BUSCA_MAX_RESULTADOS', 1000)
+
+
+def restricao(coluna, queryset):
+    """
+    Trecho `AND coluna IN (...)` que limita a busca aos produtos de
+    `queryset`, na mesma consulta do índice.
+    """
+    if queryset is None or not queryset.query.where:
+        return '', []
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    return ' AND ' + coluna + ' IN (' + sql + ')', list(params)
+
+
+class SQLiteBusca:
+    """
+    Índice invertido em uma tabela virtual FTS5, com o `rowid` igual ao id
+    do produto.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def criar(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS ' + TABELA +
+                ' USING fts5(descricao, descricao_completa,'
+                " tokenize='unicode61 remove_diacritics 2')")
+
+    def remover_tabela(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS ' + TABELA)
+
+    def indexar(self, pk, descricao, descricao_completa):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM ' + TABELA + ' WHERE rowid = %s', [pk])
+            cursor.execute(
+                'INSERT INTO ' + TABELA +
+                '(rowid, descricao, descricao_completa) VALUES (%s, %s, %s)',
+                [pk, normalizar(descricao), normalizar(descricao_completa)])
+
+    def remover(self, pk):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DELETE FROM ' + TABELA + ' WHERE rowid = %s', [pk])
+
+    def buscar(self, termos, filtro=None):
+        consulta = ' '.join('"' + t + '"*' for t in termos)
+        sql, params = restricao('rowid', filtro)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM ' + TABELA + ' WHERE ' + TABELA + ' MATCH %s' +
+                sql + ' ORDER BY bm25(' + TABELA + ', 10.0, 1.0), rowid LIMIT %s',
+                [consulta] + params + [limite()])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresBusca:
+    """
+    Índice invertido em uma coluna `tsvector` com índice GIN. O texto é
+    normalizado antes de indexar, então a configuração `simple` basta.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def criar(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS ' + TABELA + ' ('
+                ' produto_id integer PRIMARY KEY REFERENCES website_produto (id)'
+                ' ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,'
+                ' documento tsvector NOT NULL)')
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS ' + TABELA + '_documento'
+                ' ON ' + TABELA + ' USING GIN (documento)')
+
+    def remover_tabela(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS ' + TABELA)
+
+    def indexar(self, pk, descricao, descricao_completa):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO ' + TABELA + ' (produto_id, documento) VALUES (%s,'
+                " setweight(to_tsvector('simple', %s), 'A') ||"
+                " setweight(to_tsvector('simple', %s), 'B'))"
+                ' ON CONFLICT (produto_id) DO UPDATE'
+                ' SET documento = EXCLUDED.documento',
+                [pk, normalizar(descricao), normalizar(descricao_completa)])
+
+    def remover(self, pk):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM ' + TABELA + ' WHERE produto_id = %s', [pk])
+
+    def buscar(self, termos, filtro=None):
+        consulta = ' & '.join(t + ':*' for t in termos)
+        sql, params = restricao('produto_id', filtro)
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT produto_id FROM ' + TABELA +
+                ", to_tsquery('simple', %s) consulta"
+                ' WHERE documento @@ consulta' + sql +
+                ' ORDER BY ts_rank_cd(documento, consulta) DESC, produto_id'
+                ' LIMIT %s',
+                [consulta] + params + [limite()])
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteBusca,
+    'postgresql': PostgresBusca,
+}
+
+
+def get_backend(connection):
+    klass = BACKENDS.get(connection.vendor)
+    return klass(connection) if klass else None
+
+
+def get_backend_produto():
+    from .models import Produto
+    return get_backend(connections[router.db_for_write(Produto)])
+
+
+def indexar_produto(produto):
+    backend = get_backend_produto()
+    if backend is not None:
+        backend.indexar(produto.pk, produto.descricao,
+                        produto.descricao_completa)
+
+
+def remover_produto(pk):
+    backend = get_backend_produto()
+    if backend is not None:
+        backend.remover(pk)
+
+
+class ResultadoBusca:
+    """
+    Produtos encontrados no índice, do mais para o menos relevante. Pode ser
+    passada ao paginador: o total é o número de ids e o fatiamento busca no
+    banco só os produtos da página.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+        ids = self.ids[k]
+        if not ids:
+            return []
+        produtos = self.queryset.in_bulk(ids)
+        return [produtos[pk] for pk in ids if pk in produtos]
+
+    def facetas(self):
+        """
+        Facetas dos ids já encontrados, pelo índice de categorias em memória,
+        sem repetir a busca no banco.
+        """
+        from .bitmaps import indice_categorias
+        snapshot = indice_categorias.obter()
+        return snapshot.facetas(snapshot.bitset(self.ids))
+
+
+def buscar_produtos(texto, queryset):
+    """
+    Produtos de `queryset` que contêm todos os termos de `texto` (por
+    prefixo) em `descricao` ou `descricao_completa`: um `ResultadoBusca`
+    ordenado por relevância quando o banco tem índice de busca, senão o
+    próprio `queryset` filtrado com `icontains`.
+    """
+    lista = termos(texto)
+    if not lista:
+        return queryset
+    backend = get_backend(connections[queryset.db])
+    if backend is None:
+        filtro = Q()
+        for termo in texto.split():
+            filtro &= (Q(descricao__icontains=termo) |
+                       Q(descricao_completa__icontains=termo))
+        return queryset.filter(filtro)
+    try:
+        ids = backend.buscar(lista, queryset)
+    except EmptyResultSet:
+        ids = []
+    return ResultadoBusca(ids, queryset)
+
+
+def facetas_categorias(queryset):
+    """
+    Quantidade de produtos de `queryset` em cada categoria, calculada em uma
+    única consulta agrupada sobre a tabela produto-categoria.
+    """
+    from .models import Produto
+    through = Produto.categorias.through
+    produtos = queryset.order_by().values('pk')
+    qs = through.objects.filter(produto__in=produtos).values(
+        'categoria__slug', 'categoria__nome').annotate(
+        quantidade=Count('produto', distinct=True)).order_by(
+        '-quantidade', 'categoria__nome')
+    return [{'slug': c['categoria__slug'], 'nome': c['categoria__nome'],
+             'quantidade': c['quantidade']} for c in qs]
+
+
+class BuscaProdutoFilter(BaseFilterBackend):
+    """
+    Substitui o `SearchFilter` (LIKE '%termo%') pela busca no índice.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        # Deve ser o último filtro: a busca pelo índice devolve um
+        # `ResultadoBusca`, não um queryset.
+        texto = request.query_params.get(self.search_param, '')
+        return buscar_produtos(texto, queryset)
+
+    def get_schema_fields(self, view):
+        return [
+            coreapi.Field(
+                name=self.search_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    description='Termos para pesquisa')
+            )
+        ]
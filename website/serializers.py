@@ -10,14 +10,21 @@ from django.core.exceptions import ValidationError
 from .models import *
 from .recommender import recommender_produtos
 
+# Accounts
+from accounts.models import Cliente
+
+# Utils
+from utils.tasks import enfileirar
+from utils.serializers import CamposDinamicosMixin
+from utils.fields import ImagemDerivadaField
+
 # Others
 from decimal import Decimal
-from drf_extra_fields.fields import Base64ImageField
 from slugify import slugify
 from collections import OrderedDict
 
 
-class EnderecoSerializer(serializers.ModelSerializer):
+class EnderecoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Endereco
@@ -26,7 +33,7 @@ class EnderecoSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Categoria
@@ -47,8 +54,8 @@ class CategoriaSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ImagemProdutoSerializer(serializers.ModelSerializer):
-    imagem = Base64ImageField()
+class ImagemProdutoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    imagem = ImagemDerivadaField(tamanho='zoom')
 
     class Meta:
         model = ImagemProduto
@@ -78,11 +85,11 @@ class ImagemProdutoSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ProdutoSerializer(serializers.ModelSerializer):
+class ProdutoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     categorias = CategoriaSerializer(many=True)
     imagens = ImagemProdutoSerializer(
         many=True, required=False)
-    capa = Base64ImageField(allow_null=True, required=False)
+    capa = ImagemDerivadaField(tamanho='card', allow_null=True, required=False)
 
     class Meta:
         model = Produto
@@ -134,15 +141,29 @@ class ProdutoSerializer(serializers.ModelSerializer):
         return instance
 
 
-class ProdutoListSerializer(serializers.ModelSerializer):
-    capa = Base64ImageField(allow_null=True, required=False)
+class ProdutoListSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    capa = ImagemDerivadaField(tamanho='card', allow_null=True, required=False)
 
     class Meta:
         model = Produto
         fields = ['id', 'descricao', 'valor', 'capa', 'rating']
 
 
-class ItemVendaSerializer(serializers.ModelSerializer):
+class ProdutoBulkSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    valor = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=Decimal('0.00'), required=False)
+    qtd_estoque = serializers.IntegerField(min_value=0, required=False)
+    qtd_limite = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, data):
+        if len(data) == 1:
+            raise serializers.ValidationError(
+                'Informe ao menos um campo para atualizar')
+        return data
+
+
+class ItemVendaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     valor = serializers.DecimalField(
         max_digits=10, decimal_places=2, coerce_to_string=False)
 
@@ -151,16 +172,17 @@ class ItemVendaSerializer(serializers.ModelSerializer):
         fields = ['produto', 'valor', 'quantidade']
 
 
-class VendaSerializer(serializers.ModelSerializer):
+class VendaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     itens = ItemVendaSerializer(many=True)
     valor_total = serializers.DecimalField(
         max_digits=10, decimal_places=2, coerce_to_string=False, read_only=True)
 
     class Meta:
         model = Venda
-        fields = ['id', 'cliente', 'valor_total',
+        fields = ['id', 'cliente', 'valor_total', 'status',
                   'itens', 'created_at', 'endereco_entrega']
-        read_only_fields = ['id', 'valor_total', 'cliente', 'created_at']
+        read_only_fields = ['id', 'valor_total',
+                            'status', 'cliente', 'created_at']
 
     def criar_itens_vendas(self, itens_vendas_data, venda):
         for item_venda_data in itens_vendas_data:
@@ -184,10 +206,11 @@ class VendaSerializer(serializers.ModelSerializer):
         validated_data['valor_total'] = Decimal('0.0')
         venda = Venda.objects.create(cliente=cliente, **validated_data)
         self.criar_itens_vendas(itens_vendas_data, venda)
+        enfileirar('website.processar_venda', venda=venda.pk)
         return venda
 
 
-class AvaliacaoProdutoSerializer(serializers.ModelSerializer):
+class AvaliacaoProdutoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     class Meta:
         model = AvaliacaoProduto
@@ -207,9 +230,9 @@ class AvaliacaoProdutoSerializer(serializers.ModelSerializer):
         return avaliacao
 
 
-class OfertaSerializer(serializers.ModelSerializer):
-    foto = Base64ImageField(
-        allow_null=True, required=False)
+class OfertaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    foto = ImagemDerivadaField(
+        tamanho='zoom', allow_null=True, required=False)
     validade = serializers.DateTimeField(format="%d/%m/%YT%H:%M")
 
     class Meta:
@@ -231,7 +254,7 @@ class OfertaSerializer(serializers.ModelSerializer):
         return oferta
 
 
-class ItemCarrinhoRetrieveSerializer(serializers.ModelSerializer):
+class ItemCarrinhoRetrieveSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     produto = ProdutoListSerializer()
 
     class Meta:
@@ -240,7 +263,7 @@ class ItemCarrinhoRetrieveSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'valor']
 
 
-class CarrinhoRetrieveSerializer(serializers.ModelSerializer):
+class CarrinhoRetrieveSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     itens = ItemCarrinhoRetrieveSerializer(source="itens_carrinho", many=True)
 
     @property
@@ -255,7 +278,7 @@ class CarrinhoRetrieveSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class ItemCarrinhoSerializer(serializers.ModelSerializer):
+class ItemCarrinhoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     produto = ProdutoListSerializer()
 
     class Meta:
@@ -264,7 +287,7 @@ class ItemCarrinhoSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'valor']
 
 
-class CarrinhoSerializer(serializers.ModelSerializer):
+class CarrinhoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
 
     @property
     def data(self):
@@ -0,0 +1,120 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import (Produto, Categoria, ImagemProduto,
+                     AvaliacaoProduto, Oferta)
+from .bitmaps import indice_categorias
+from .cache import invalidar_produtos, invalidar_ofertas
+from . import search
+
+from utils.tasks import enfileirar
+
+
+@receiver(post_save, sender=Produto)
+def indexar_produto(sender, instance, raw=False, created=False, **kwargs):
+    # Só quando o texto muda: a baixa de estoque da venda também salva o
+    # produto.
+    if not raw and (created or instance.texto_alterado):
+        search.indexar_produto(instance)
+    if created or instance.descricao_alterada:
+        # A posição dos produtos no índice segue a ordenação por descrição.
+        indice_categorias.invalidar()
+    instance._descricao_carregada = instance.descricao
+    instance._descricao_completa_carregada = instance.descricao_completa
+    invalidar_produtos(instance.pk)
+
+
+@receiver(post_delete, sender=Produto)
+def remover_produto_do_indice(sender, instance, **kwargs):
+    search.remover_produto(instance.pk)
+    indice_categorias.invalidar()
+    invalidar_produtos(instance.pk)
+
+
+@receiver(m2m_changed, sender=Produto.categorias.through)
+def categorias_alteradas(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._produtos_removidos = list(
+            instance.produtos.values_list('pk', flat=True))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        indice_categorias.invalidar()
+        if not reverse:
+            invalidar_produtos(instance.pk)
+        elif action == 'post_clear':
+            invalidar_produtos(*getattr(instance, '_produtos_removidos', []))
+        else:
+            invalidar_produtos(*pk_set)
+
+
+@receiver(pre_delete, sender=Categoria)
+def guardar_produtos_da_categoria(sender, instance, **kwargs):
+    instance._produtos_removidos = list(
+        instance.produtos.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def categoria_alterada(sender, instance, update_fields=None, **kwargs):
+    # Contagem de acessos não muda o índice nem as respostas em cache.
+    if update_fields is not None and set(update_fields) <= {'qtd_acessos'}:
+        return
+    indice_categorias.invalidar()
+    if hasattr(instance, '_produtos_removidos'):
+        invalidar_produtos(*instance._produtos_removidos)
+    else:
+        invalidar_produtos(*instance.produtos.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=ImagemProduto)
+@receiver(post_delete, sender=ImagemProduto)
+@receiver(post_save, sender=AvaliacaoProduto)
+@receiver(post_delete, sender=AvaliacaoProduto)
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+def relacionamento_do_produto_alterado(sender, instance, **kwargs):
+    invalidar_produtos(instance.produto_id)
+
+
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+def oferta_alterada(sender, instance, **kwargs):
+    invalidar_ofertas()
+
+
+@receiver(pre_save, sender=ImagemProduto)
+@receiver(pre_save, sender=Oferta)
+def imagem_alterada(sender, instance, **kwargs):
+    if instance.imagem_alterada:
+        instance.derivados_gerados = False
+        carregada = getattr(instance, '_imagem_carregada', None)
+        instance._imagem_substituida = getattr(carregada, 'name', carregada)
+
+
+@receiver(post_save, sender=ImagemProduto)
+@receiver(post_save, sender=Oferta)
+def agendar_derivados(sender, instance, raw=False, **kwargs):
+    if not raw and instance.arquivo_imagem and not instance.derivados_gerados:
+        if getattr(instance, '_derivados_agendados', None) != instance.arquivo_imagem.name:
+            enfileirar('website.gerar_derivados',
+                       modelo=sender._meta.label, pk=instance.pk)
+            instance._derivados_agendados = instance.arquivo_imagem.name
+    instance._imagem_carregada = instance.arquivo_imagem.name or None
+    substituida = getattr(instance, '_imagem_substituida', None)
+    if substituida:
+        liberar_imagem(instance.arquivo_imagem.storage, substituida)
+        instance._imagem_substituida = None
+
+
+@receiver(post_delete, sender=ImagemProduto)
+@receiver(post_delete, sender=Oferta)
+def imagem_removida(sender, instance, **kwargs):
+    if instance.arquivo_imagem:
+        liberar_imagem(instance.arquivo_imagem.storage, instance.arquivo_imagem.name)
+
+
+def liberar_imagem(storage, nome):
+    # Outros registros podem apontar para o mesmo arquivo (utils.storage):
+    # a contagem só vale depois do commit.
+    if hasattr(storage, 'liberar'):
+        transaction.on_commit(lambda: storage.liberar(nome))
@@ -0,0 +1,31 @@
+from django.apps import apps
+
+from utils.tasks import tarefa
+from utils import imagens
+
+from .models import Venda
+
+
+@tarefa('website.processar_venda')
+def processar_venda(venda):
+    """
+    Etapas pós-compra que não precisam rodar dentro da requisição.
+    """
+    venda = Venda.objects.select_for_update().get(pk=venda)
+    if venda.status != Venda.PENDENTE:
+        return
+    venda.status = Venda.CONFIRMADA
+    venda.save()
+
+
+@tarefa('website.gerar_derivados')
+def gerar_derivados(modelo, pk):
+    """
+    Versões redimensionadas da imagem de um `ModelImagem`.
+    """
+    instance = apps.get_model(modelo).objects.filter(pk=pk).first()
+    if instance is None or instance.derivados_gerados or not instance.arquivo_imagem:
+        return
+    imagens.gerar_derivados(instance.arquivo_imagem)
+    instance.derivados_gerados = True
+    instance.save(update_fields=['derivados_gerados'])
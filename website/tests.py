@@ -5,12 +5,139 @@ from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from website.models import Cliente, Endereco, Carrinho, Categoria, Produto, ItemCarrinho, Venda, Oferta
+from rest_framework.test import APITransactionTestCase
+
+from django.core.cache import cache
+
+from accounts.models import Cliente
+from website.models import (Endereco, Carrinho, Categoria, Produto, ItemCarrinho, Venda, Oferta,
+                            ChaveIdempotencia)
+from website.idempotency import digest
 from decimal import Decimal
+from base64 import urlsafe_b64encode
 from rest_framework_jwt.settings import api_settings
+import json
 # Create your tests here.
 
 
+class IdempotenciaTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='turing', password='senhama9', email='alan_turing@lfc.com')
+        self.carrinho = Carrinho.objects.create()
+        cliente = Cliente.objects.create(
+            user=self.user, carrinho=self.carrinho, nome='Alan', sobrenome='Turing', cpf='45454300000')
+        self.endereco = Endereco.objects.create(
+            bairro='Leblon', rua='Rua dos Bobos', numero_casa=0, cep='12345-678', cidade='Rio de Janeiro')
+        cliente.enderecos.add(self.endereco)
+        produto = Produto.objects.create(
+            descricao='Computador', valor=Decimal('10.00'), qtd_estoque=5)
+        ItemCarrinho.objects.create(
+            carrinho=self.carrinho, produto=produto, valor=Decimal('10.00'), quantidade=2)
+        self.client.force_authenticate(self.user)
+        self.url = reverse('carrinho-compra', kwargs={'pk': self.carrinho.pk})
+
+    def comprar(self, chave, data=None):
+        return self.client.post(self.url, data or {'endereco': self.endereco.pk},
+                                format='json', HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_resposta_armazenada(self):
+        primeira = self.comprar('compra-1')
+        segunda = self.comprar('compra-1')
+        self.assertEqual(primeira.status_code, status.HTTP_200_OK)
+        self.assertEqual(segunda.status_code, status.HTTP_200_OK)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.data['id'], primeira.data['id'])
+        self.assertEqual(Venda.objects.count(), 1)
+        self.assertEqual(Produto.objects.get().qtd_estoque, 3)
+
+    def test_chave_em_processamento_devolve_409(self):
+        ChaveIdempotencia.objects.create(
+            user=self.user, endpoint='carrinhos-compra', chave='compra-1',
+            digest_requisicao=digest({'endereco': self.endereco.pk}))
+        response = self.comprar('compra-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Venda.objects.count(), 0)
+
+    def test_chave_reutilizada_com_outra_requisicao(self):
+        self.comprar('compra-1')
+        response = self.comprar('compra-1', {'endereco': self.endereco.pk, 'outro': 1})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+
+class CursorTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='admin', password='senhama9', email='admin@admin.com', is_staff=True)
+        self.client.force_authenticate(self.user)
+        self.categoria = Categoria.objects.create(nome='Eletrônicos')
+        for i in range(3):
+            produto = Produto.objects.create(
+                descricao='Produto %d' % i, valor=Decimal('10.00'), qtd_estoque=5)
+            produto.categorias.add(self.categoria)
+        self.url = reverse('categoria-produtos', kwargs={'pk': self.categoria.pk})
+
+    @staticmethod
+    def cursor(posicao):
+        return urlsafe_b64encode(json.dumps({'p': posicao}).encode('utf-8')).decode('ascii')
+
+    def test_proxima_pagina(self):
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['descricao'] for p in response.data['results']], ['Produto 2'])
+
+    def test_cursor_invalido(self):
+        for cursor in ['nao-e-base64', self.cursor(['Produto 0']),
+                       self.cursor(['Produto 0', 'abc']), self.cursor([{}, 1])]:
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, cursor)
+
+    def test_cursor_com_data_invalida(self):
+        response = self.client.get(reverse('venda-list'),
+                                   {'cursor': self.cursor(['ontem', 1])})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CacheProdutoTests(APITransactionTestCase):
+    """
+    Transacional: as versões do cache só são incrementadas no commit.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(
+            username='admin', password='senhama9', email='admin@admin.com', is_staff=True)
+        self.produto = Produto.objects.create(
+            descricao='Computador', valor=Decimal('10.00'), qtd_estoque=5)
+
+    def test_detalhe_atualizado_depois_da_alteracao(self):
+        url = reverse('produto-detail', kwargs={'pk': self.produto.pk})
+        self.assertEqual(self.client.get(url).data['descricao'], 'Computador')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.patch(url, {'descricao': 'Notebook'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(None)
+
+        self.assertEqual(json.loads(self.client.get(url).content)['descricao'], 'Notebook')
+        response = self.client.get('/produtos/0%d/' % self.produto.pk)
+        self.assertEqual(json.loads(response.content)['descricao'], 'Notebook')
+
+    def test_listagem_atualizada_depois_da_alteracao(self):
+        url = reverse('produto-list')
+        self.client.get(url)
+        Produto.objects.filter(pk=self.produto.pk).get().delete()
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['count'], 0)
+
+
 '''
 class AccountTests(APITestCase):
 
@@ -1,19 +1,33 @@
 # Rest Framework
-from rest_framework import viewsets, mixins, filters, status
+from rest_framework import viewsets, mixins, status
 from rest_framework.exceptions import NotAuthenticated, PermissionDenied
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 
 # Django
+from django.db import transaction
 from django.db.models import F, Count
 from django.utils import timezone
 from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
 
 
 # Website
 from .recommender import recommender_produtos
+from .idempotency import idempotente
+from .pagination import VendaPagination, AvaliacaoProdutoPagination, ProdutoPagination
+from .search import BuscaProdutoFilter, ResultadoBusca, buscar_produtos, facetas_categorias
+from .bitmaps import indice_categorias, CHAVE_VERSAO as CHAVE_VERSAO_INDICE
+from .feeds import feed_banners, MAX_AGE_BANNERS
+from .exportacao import itens_vendas, FORMATOS as FORMATOS_EXPORTACAO
+from .importacao import importar_produtos, LEITORES as LEITORES_IMPORTACAO
+from .cache import (produto_serializado, versao_produto, versao_produtos, invalidar_produtos,
+                    chave_versao_produto, CHAVE_VERSAO_PRODUTOS, CHAVE_VERSAO_OFERTAS)
 from .permissions import IsStaffAndOwnerOrReadOnly, IsStaff, CarrinhoPermission
 from .models import *
 from .serializers import *
@@ -26,15 +40,24 @@ from accounts.serializers import ClienteSerializer
 from utils.shortcuts import get_object_or_404
 from utils.fields import get_fields
 from utils.schemas import CustomSchema, Schema
-from utils.viewsets import list_response, paginated_schema
-
-from drf_yasg.utils import swagger_auto_schema
+from utils.viewsets import (list_response, paginated_schema, condicional, CondicionalMixin,
+                            prefetch_campos, PrefetchCamposMixin)
+from utils.serializers import campos_solicitados
+from utils.cache import versao, cache_anonimo
+from utils.tasks import enfileirar
+from utils.renderers import FastJSONRenderer, CSVStreamRenderer, NDJSONStreamRenderer
+from utils.uploads import UploadMultiPartParser
+
+from drf_yasg.utils import swagger_auto_schema, no_body
 from drf_yasg import openapi
 from django.utils.decorators import method_decorator
 from utils.inspectors import PageNumberPaginatorInspectorClass
 
+# Others
+import time
+
 
-class EnderecoViewSet(viewsets.ModelViewSet):
+class EnderecoViewSet(CondicionalMixin, viewsets.ModelViewSet):
     """
 
     Endpoint relacionado aos endereços.
@@ -45,7 +68,8 @@ class EnderecoViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
 
-class ProdutoViewSet(mixins.CreateModelMixin,
+class ProdutoViewSet(CondicionalMixin,
+                     mixins.CreateModelMixin,
                      mixins.UpdateModelMixin,
                      viewsets.GenericViewSet):
 
@@ -57,8 +81,10 @@ class ProdutoViewSet(mixins.CreateModelMixin,
     serializer_class = ProdutoSerializer
     queryset = Produto.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    search_fields = ['descricao']
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (BuscaProdutoFilter,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    count_strategy = 'cached'
+    count_cache_tags = (CHAVE_VERSAO_PRODUTOS,)
 
     # @swagger_auto_schema(operation_description="")
     tags = openapi.Parameter(name='tags',
@@ -72,22 +98,112 @@ class ProdutoViewSet(mixins.CreateModelMixin,
                                     'capa': openapi.Schema(type=openapi.TYPE_STRING),
                                     'rating': openapi.Schema(type=openapi.TYPE_NUMBER)})
 
-    @swagger_auto_schema(manual_parameters=[tags], responses={200: paginated_schema(produto_schema)})
+    facets_schema = openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+        'categorias': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+            type=openapi.TYPE_OBJECT, properties={
+                'slug': openapi.Schema(type=openapi.TYPE_STRING),
+                'nome': openapi.Schema(type=openapi.TYPE_STRING),
+                'quantidade': openapi.Schema(type=openapi.TYPE_INTEGER),
+            }))
+    })
+
+    tags_modo = openapi.Parameter(name='tags_modo',
+                                  in_=openapi.IN_QUERY,
+                                  type=openapi.TYPE_STRING,
+                                  enum=['or', 'and'],
+                                  description='Produtos em qualquer uma (or) ou em todas (and) as categorias')
+
+    def get_etag_extra(self, request, *args, **kwargs):
+        # Categorias, imagens e avaliações não alteram o update_at do produto.
+        if self.lookup_field in kwargs:
+            return versao_produto(kwargs[self.lookup_field])
+        return '%s:%s' % (versao_produtos(), versao(CHAVE_VERSAO_INDICE))
+
+    def get_queryset_condicional(self, request, *args, **kwargs):
+        # Sem a busca, que não devolve um queryset: o texto buscado já está
+        # na query string que entra no ETag.
+        queryset = self.get_queryset()
+        if self.lookup_field in kwargs:
+            queryset = queryset.filter(**{self.lookup_field: kwargs[self.lookup_field]})
+        return queryset
+
+    def get_pk(self, kwargs):
+        try:
+            return int(kwargs[self.lookup_field])
+        except ValueError:
+            raise Http404
+
+    def registrar_acessos(self, request, pk=None):
+        # Fora do cache de respostas, para contar também os acessos servidos
+        # do cache ou respondidos com 304.
+        if pk is not None:
+            Categoria.objects.filter(produtos__pk=pk).update(
+                qtd_acessos=F('qtd_acessos') + 1)
+            return
+        slugs = request.query_params.get('tags', None)
+        if slugs:
+            Categoria.objects.filter(slug__in=slugs.split(',')).update(
+                qtd_acessos=F('qtd_acessos') + 1)
+
+    @swagger_auto_schema(manual_parameters=[tags, tags_modo], responses={200: paginated_schema(produto_schema, facets=facets_schema)})
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        self.registrar_acessos(request)
+        return self.listar(request, *args, **kwargs)
+
+    @cache_anonimo(CHAVE_VERSAO_PRODUTOS, CHAVE_VERSAO_INDICE)
+    @condicional
+    def listar(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
         slugs = request.query_params.get('tags', None)
+        modo = request.query_params.get('tags_modo', 'or')
+        busca = request.query_params.get('search', None)
         if slugs:
             slugs = slugs.split(',')
-            categorias = Categoria.objects.filter(slug__in=slugs)
-            categorias.update(qtd_acessos=F('qtd_acessos') + 1)
-            queryset = queryset.filter(categorias__in=categorias).distinct()
-        return list_response(self, ProdutoListSerializer, queryset, request)
+            if not busca:
+                # Navegação por categorias: filtro e página saem do índice em
+                # memória, e o banco só busca os produtos da página.
+                resultado = indice_categorias.filtrar(
+                    slugs, self.filter_queryset(queryset), modo)
+                response = list_response(
+                    self, ProdutoListSerializer, resultado, request)
+                response.data['facets'] = {'categorias': resultado.facetas()}
+                return response
+            if modo == 'and':
+                for slug in slugs:
+                    queryset = queryset.filter(categorias__slug=slug)
+            else:
+                queryset = queryset.filter(categorias__slug__in=slugs).distinct()
+        # A busca vem depois das categorias: ela ordena por relevância e pode
+        # devolver um `ResultadoBusca` em vez de um queryset.
+        resultado = self.filter_queryset(queryset)
+        response = list_response(
+            self, ProdutoListSerializer, resultado, request)
+        if isinstance(resultado, ResultadoBusca):
+            facetas = resultado.facetas()
+        elif busca:
+            facetas = facetas_categorias(resultado)
+        else:
+            facetas = indice_categorias.facetas()
+        response.data['facets'] = {'categorias': facetas}
+        return response
 
     def retrieve(self, request, *args, **kwargs):
-        produto = self.get_object()
-        produto.categorias.update(qtd_acessos=F('qtd_acessos') + 1)
-        serializer = self.get_serializer(produto)
-        return Response(serializer.data)
+        # As chaves de cache e o ETag usam o id já convertido: `/produtos/01/`
+        # e `/produtos/1/` são o mesmo produto e a mesma versão.
+        kwargs[self.lookup_field] = self.get_pk(kwargs)
+        self.registrar_acessos(request, kwargs[self.lookup_field])
+        return self.detalhar(request, *args, **kwargs)
+
+    @cache_anonimo(chave_versao_produto)
+    @condicional
+    def detalhar(self, request, *args, **kwargs):
+        fields, expand = campos_solicitados(request)
+        if fields is not None or expand:
+            return Response(self.get_serializer(self.get_object()).data)
+        pk = kwargs[self.lookup_field]
+        data = produto_serializado(
+            pk, lambda: self.get_serializer(self.get_object()).data, request)
+        return Response(data)
 
     categorias_body = openapi.Schema(
         type=openapi.TYPE_OBJECT,
@@ -103,19 +219,43 @@ class ProdutoViewSet(mixins.CreateModelMixin,
 
             if request.method == "POST":
                 try:
-                    data = request.data['categorias']
-                    for categoria in data:
-                        slug = slugify(categoria)
-                        c, _ = Categoria.objects.get_or_create(
-                            nome=categoria, slug=slug)
-                        produto.categorias.add(c)
-                    produto.save()
+                    produto.add_categorias(request.data['categorias'])
                     serializer = self.get_serializer(produto)
                     return Response(serializer.data, status=status.HTTP_201_CREATED)
                 except KeyError:
                     data = {'detail': 'O campo categoria é obrigatório'}
                     return Response(data, status=status.HTTP_400_BAD_REQUEST)
 
+    categorias_lote_body = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'produtos': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+            'categorias': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))
+        })
+
+    @swagger_auto_schema(method='post', request_body=categorias_lote_body, responses={200: CategoriaSerializer(many=True)})
+    @action(methods=['post'], detail=False, url_path='categorias',
+            url_name='adicionar-categorias', permission_classes=[IsStaff])
+    def adicionar_categorias(self, request, *args, **kwargs):
+        """
+        Adiciona as mesmas categorias a vários produtos.
+        """
+        pks, nomes = get_fields(request.data, ['produtos', 'categorias'])
+        if (not isinstance(pks, list) or not isinstance(nomes, list)
+                or not all(type(pk) is int for pk in pks)
+                or not all(isinstance(nome, str) and nome.strip() for nome in nomes)):
+            data = {'detail': 'Os campos produtos e categorias devem ser listas '
+                              'de ids e de nomes de categorias'}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        existentes = set(Produto.objects.filter(
+            pk__in=pks).values_list('pk', flat=True))
+        faltando = sorted(set(pks) - existentes)
+        if faltando:
+            data = {'detail': 'Produtos não encontrados', 'ids': faltando}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        categorias = Produto.adicionar_categorias(existentes, nomes)
+        return Response(CategoriaSerializer(categorias, many=True).data)
+
     @action(methods=['delete'], detail=True, url_path='categorias/(?P<categoria_slug>[^/.]+)')
     def remover_categoria(self, request, pk, categoria_slug):
         if request.user.is_staff:
@@ -128,6 +268,75 @@ class ProdutoViewSet(mixins.CreateModelMixin,
         else:
             raise PermissionDenied
 
+    @swagger_auto_schema(method='patch', request_body=ProdutoBulkSerializer(many=True),
+                         responses={200: openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+                             'atualizados': openapi.Schema(type=openapi.TYPE_INTEGER)})})
+    @action(methods=['patch'], detail=False, permission_classes=[IsStaff])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Atualiza valor e estoque de vários produtos de uma vez.
+        """
+        serializer = ProdutoBulkSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        alteracoes = {}
+        for item in serializer.validated_data:
+            alteracoes.setdefault(item.pop('id'), {}).update(item)
+        existentes = set(Produto.objects.filter(
+            pk__in=list(alteracoes)).values_list('pk', flat=True))
+        faltando = sorted(set(alteracoes) - existentes)
+        if faltando:
+            data = {'detail': 'Produtos não encontrados', 'ids': faltando}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+        # Um bulk_update (UPDATE ... CASE) por combinação de campos enviados.
+        agora = timezone.now()
+        grupos = {}
+        for pk, campos in alteracoes.items():
+            grupos.setdefault(tuple(sorted(campos)), []).append(
+                Produto(pk=pk, update_at=agora, **campos))
+        with transaction.atomic():
+            for campos, produtos in grupos.items():
+                Produto.objects.bulk_update(
+                    produtos, list(campos) + ['update_at'], batch_size=500)
+        # bulk_update não dispara os signals.
+        invalidar_produtos(*alteracoes)
+        return Response({'atualizados': len(alteracoes)})
+
+    importar_parameters = [
+        openapi.Parameter(name='arquivo', in_=openapi.IN_FORM, type=openapi.TYPE_FILE,
+                          required=True, description='Arquivo CSV ou NDJSON'),
+        openapi.Parameter(name='formato', in_=openapi.IN_FORM, type=openapi.TYPE_STRING,
+                          enum=['csv', 'ndjson'], description='Padrão: extensão do arquivo'),
+    ]
+    importar_response = openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+        'criados': openapi.Schema(type=openapi.TYPE_INTEGER),
+        'total_erros': openapi.Schema(type=openapi.TYPE_INTEGER),
+        'erros': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+            type=openapi.TYPE_OBJECT, properties={
+                'linha': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'erros': openapi.Schema(type=openapi.TYPE_OBJECT),
+            })),
+    })
+
+    @swagger_auto_schema(method='post', request_body=no_body, manual_parameters=importar_parameters,
+                         responses={200: importar_response})
+    @action(methods=['post'], detail=False, permission_classes=[IsStaff],
+            parser_classes=[MultiPartParser])
+    def importar(self, request, *args, **kwargs):
+        """
+        Importação em lote de produtos (ver `manage.py importar_produtos`).
+        """
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            data = {'detail': 'O campo arquivo é obrigatório'}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        formato = request.data.get('formato') or arquivo.name.rsplit('.', 1)[-1].lower()
+        if formato not in LEITORES_IMPORTACAO:
+            data = {'detail': 'Formato desconhecido: %s' % formato}
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        resultado = importar_produtos(LEITORES_IMPORTACAO[formato](arquivo))
+        return Response(resultado.to_dict())
+
     imagens_body = openapi.Schema(
         type=openapi.TYPE_OBJECT,
         properties={
@@ -140,12 +349,23 @@ class ProdutoViewSet(mixins.CreateModelMixin,
         })
 
     @swagger_auto_schema(method='post', request_body=imagens_body, responses={200: ProdutoSerializer})
-    @action(methods=['post'], detail=True)
+    @action(methods=['post'], detail=True, parser_classes=[JSONParser, UploadMultiPartParser])
     def imagens(self, request, pk, *args, **kwargs):
+        """
+        Aceita JSON com as imagens em base64 ou multipart com um ou mais
+        arquivos no campo `imagens` (e `capa` para marcar o primeiro).
+        """
         if request.user.is_staff:
             produto = Produto.objects.get(pk=pk)
             try:
-                data = request.data['imagens']
+                if request.FILES:
+                    capa = request.data.get('capa', '').lower() in ('1', 'true', 'on')
+                    data = [{'imagem': arquivo, 'capa': capa and i == 0}
+                            for i, arquivo in enumerate(request.FILES.getlist('imagens'))]
+                    if not data:
+                        raise KeyError('imagens')
+                else:
+                    data = request.data['imagens']
 
                 for imagem in data:
                     imagem['produto'] = produto.pk
@@ -170,8 +390,9 @@ class ProdutoViewSet(mixins.CreateModelMixin,
             if not qs.filter(capa=True).exists():
                 qs.delete()
                 nova_capa = self.get_object().imagens.first()
-                nova_capa.capa = True
-                nova_capa.save()
+                if nova_capa is not None:
+                    nova_capa.capa = True
+                    nova_capa.save()
             else:
                 qs.delete()
             serializer = self.serializer_class(produto)
@@ -189,8 +410,10 @@ class ProdutoListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = ProdutoListSerializer
     queryset = Produto.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
-    search_fields = ['descricao']
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (BuscaProdutoFilter,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    count_strategy = 'cached'
+    count_cache_tags = (CHAVE_VERSAO_PRODUTOS,)
     tags = openapi.Parameter(name='tags',
                              in_=openapi.IN_QUERY,
                              type=openapi.TYPE_STRING,
@@ -198,17 +421,19 @@ class ProdutoListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
     @swagger_auto_schema(manual_parameters=[tags])
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        queryset = self.get_queryset()
         slugs = request.query_params.get('tags', None)
         if slugs:
             slugs = slugs.split(',')
             categorias = Categoria.objects.filter(slug__in=slugs)
             categorias.update(qtd_acessos=F('qtd_acessos') + 1)
             queryset = queryset.filter(categorias__in=categorias).distinct()
+        queryset = self.filter_queryset(queryset)
         return list_response(self, self.get_serializer, queryset, request)
 
 
-class VendaViewSet(mixins.CreateModelMixin,
+class VendaViewSet(PrefetchCamposMixin,
+                   mixins.CreateModelMixin,
                    mixins.RetrieveModelMixin,
                    viewsets.GenericViewSet):
 
@@ -218,6 +443,9 @@ class VendaViewSet(mixins.CreateModelMixin,
     serializer_class = VendaSerializer
     queryset = Venda.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    pagination_class = VendaPagination
+    prefetch_plano = {'itens': ['itens']}
 
     data_inicial = openapi.Parameter(name='inicio',
                                      in_=openapi.IN_QUERY,
@@ -241,6 +469,39 @@ class VendaViewSet(mixins.CreateModelMixin,
             qs = qs.filter(created_at__lte=fim)
         return list_response(self, self.get_serializer, qs, request)
 
+    formato_parameter = openapi.Parameter(name='format',
+                                          in_=openapi.IN_QUERY,
+                                          type=openapi.TYPE_STRING,
+                                          enum=['csv', 'ndjson'],
+                                          description='Formato do arquivo (csv ou ndjson)')
+
+    @swagger_auto_schema(method='get', manual_parameters=[data_inicial, data_fim, formato_parameter],
+                         responses={200: openapi.Schema(type=openapi.TYPE_FILE)})
+    @action(methods=['get'], detail=False, permission_classes=[IsStaff],
+            renderer_classes=[CSVStreamRenderer, NDJSONStreamRenderer])
+    def export(self, request, *args, **kwargs):
+        """
+        Exporta os itens das vendas do período, uma linha por item.
+        """
+        inicio = request.query_params.get('inicio', None)
+        fim = request.query_params.get('fim', None)
+        qs = Venda.objects.all()
+        if inicio is not None:
+            qs = qs.filter(created_at__gte=inicio)
+        if fim is not None:
+            qs = qs.filter(created_at__lte=fim)
+        formato = request.accepted_renderer.format
+        gerar, content_type = FORMATOS_EXPORTACAO[formato]
+        response = StreamingHttpResponse(
+            gerar(itens_vendas(qs)), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="vendas.%s"' % formato
+        return response
+
+    @idempotente('vendas-create')
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
 
 class AvaliacaoProdutoViewSet(mixins.CreateModelMixin,
                               mixins.ListModelMixin,
@@ -250,9 +511,10 @@ class AvaliacaoProdutoViewSet(mixins.CreateModelMixin,
     serializer_class = AvaliacaoProdutoSerializer
     queryset = AvaliacaoProduto.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    pagination_class = AvaliacaoProdutoPagination
 
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(CondicionalMixin, viewsets.ModelViewSet):
     """
     Endpoint relacionado as categorias.
     """
@@ -283,15 +545,15 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     def produtos(self, request, pk, *args, **kwargs):
         search = request.query_params.get('search', None)
         categoria = self.get_object()
-        categoria.qtd_acessos += 1
-        categoria.save()
+        # Sem `save()`: o post_save da categoria invalidaria o índice e os caches.
+        Categoria.objects.filter(pk=categoria.pk).update(qtd_acessos=F('qtd_acessos') + 1)
+        qs = prefetch_campos(categoria.produtos.all(), request,
+                             {'categorias': ['categorias'], 'imagens': ['imagens']})
         if search:
-            qs = categoria.produtos.filter(
-                descricao__icontains=search)
-        else:
-            qs = categoria.produtos.all()
-        serializer = ProdutoSerializer(qs, many=True)
-        return list_response(self, ProdutoSerializer, qs, request)
+            # Ordenados por relevância: paginação por número de página.
+            return list_response(self, ProdutoSerializer, buscar_produtos(search, qs), request)
+        return list_response(self, ProdutoSerializer, qs, request,
+                             pagination_class=ProdutoPagination)
 
     info_response = openapi.Schema(
         title='Categoria',
@@ -356,13 +618,32 @@ class CategoriaViewSet(viewsets.ModelViewSet):
         return Response(top_categorias.order_by('-receita')[:n])
 
 
-class OfertaViewSet(viewsets.ModelViewSet):
+class OfertaViewSet(CondicionalMixin, viewsets.ModelViewSet):
     serializer_class = OfertaSerializer
-    queryset = Oferta.objects.filter(validade__gte=timezone.now())
+    queryset = Oferta.objects.all()
     permission_classes = (IsStaffAndOwnerOrReadOnly,)
+    parser_classes = (JSONParser, UploadMultiPartParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('is_banner',)
 
+    def get_queryset(self):
+        return self.queryset.filter(validade__gte=timezone.now())
+
+    @swagger_auto_schema(method='get', responses={200: OfertaSerializer(many=True)})
+    @action(methods=['get'], detail=False)
+    def banners(self, request, *args, **kwargs):
+        feed = feed_banners(request)
+        response = get_conditional_response(request, etag=feed['etag'])
+        if response is None:
+            response = HttpResponse(
+                feed['conteudo'], content_type='application/json')
+        # Cache curto no cliente/CDN: a versão das ofertas só invalida o feed
+        # no servidor; depois disso o ETag revalida com um 304.
+        restante = max(int(feed['expira'] - time.time()), 0)
+        response['ETag'] = feed['etag']
+        response['Cache-Control'] = 'public, max-age=%d' % min(restante, MAX_AGE_BANNERS)
+        return response
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -372,6 +653,11 @@ class OfertaViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @cache_anonimo(CHAVE_VERSAO_OFERTAS, CHAVE_VERSAO_PRODUTOS)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @condicional
     def retrieve(self, request, *args, **kwargs):
         oferta = self.get_object()
         oferta.produto.categorias.update(qtd_acessos=F('qtd_acessos') + 1)
@@ -490,6 +776,7 @@ class CarrinhoViewSet(mixins.RetrieveModelMixin,
 
     @swagger_auto_schema(method='post', request_body=compra_response, responses={200: VendaSerializer})
     @action(methods=['post'], detail=True)
+    @idempotente('carrinhos-compra')
     def compra(self, request, pk):
         if request.user.is_authenticated:
             messages = []
@@ -499,11 +786,14 @@ class CarrinhoViewSet(mixins.RetrieveModelMixin,
             endereco_pk, *_ = get_fields(request.data, ['endereco'])
             endereco = cliente.enderecos.get(pk=endereco_pk)
             if cliente.carrinho.itens_carrinho.count():
-                venda = cliente.carrinho.to_venda()
-                venda.endereco_entrega = endereco
-                venda.save()
-                cliente.carrinho.itens_carrinho.all().delete()
-                cliente.carrinho.atualizar_valor()
+                with transaction.atomic():
+                    venda = cliente.carrinho.to_venda()
+                    venda.endereco_entrega = endereco
+                    venda.save()
+                    cliente.carrinho.itens_carrinho.all().delete()
+                    cliente.carrinho.valor_total = Decimal('0.00')
+                    cliente.carrinho.save()
+                    enfileirar('website.processar_venda', venda=venda.pk)
                 serializer = VendaSerializer(venda)
                 data = serializer.data
                 data['messages'] = messages